@@ -0,0 +1,194 @@
+import asyncio
+import threading
+import time
+
+from loguru import logger
+
+from aevo import AevoClient
+
+# Account settings passed to AevoClient, the rest is kept as strategy settings
+CLIENT_ARGS = (
+    "signing_key",
+    "wallet_address",
+    "wallet_private_key",
+    "api_key",
+    "api_secret",
+    "env",
+    "rest_headers",
+    "rest_url",
+    "ws_url",
+)
+
+
+class TokenBucket:
+    def __init__(self, rate=10.0, burst=20):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens=1):
+        with self._lock:
+            self._refill()
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return True
+            return False
+
+    def delay(self, tokens=1):
+        with self._lock:
+            self._refill()
+            return max(0.0, (tokens - self.tokens) / self.rate)
+
+    async def acquire(self, tokens=1):
+        while not self.try_acquire(tokens):
+            await asyncio.sleep(self.delay(tokens))
+
+
+class AccountHandle:
+    def __init__(self, name, client, bucket, settings=None, pinned=False):
+        self.name = name
+        self.client = client
+        self.bucket = bucket
+        self.settings = settings or {}
+        self.pinned = pinned
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.requests = 0
+
+    def touch(self):
+        self.last_used = time.monotonic()
+        self.requests += 1
+
+    async def close(self):
+        if self.client.connection is not None:
+            await self.client.close_connection()
+            self.client.connection = None
+        await self.client.close_session()
+        # client is created on first access, an account that never used
+        # the blocking REST calls has nothing to close
+        if self.client._client is not None:
+            self.client.client.close()
+
+
+class AccountPool:
+    """Aevo accounts of one process, created on first use and evicted when idle.
+
+    ``accounts`` maps a name to AevoClient arguments plus optional ``rate`` and
+    ``burst`` of the account's request budget, any other keys (instrument_id,
+    quantity...) are kept as the account's settings. Each account gets its own
+    client with the signing key parsed once and pooled HTTP sessions, signals
+    of an account go over REST. Built clients have no pre-trade risk, order
+    manager or position tracker attached, their orders are only checked by
+    the exchange. Accounts unused for ``idle_timeout`` seconds are closed,
+    registered ones stay. A ``clock`` (ClockSync) is shared by all
+    clients, the exchange time is the same for every account.
+    """
+
+    def __init__(
+        self,
+        accounts=None,
+        rate=10.0,
+        burst=20,
+        idle_timeout=900.0,
+        factory=AevoClient,
+        clock=None,
+    ):
+        self.configs = dict(accounts or {})
+        self.rate = rate
+        self.burst = burst
+        self.idle_timeout = idle_timeout
+        self.factory = factory
+        self.clock = clock
+        self.handles = {}
+        self.evicted = 0
+        self._lock = threading.Lock()
+
+    def register(self, name, client, rate=None, burst=None, **settings):
+        """Adds an already built client, it is never evicted."""
+        handle = AccountHandle(
+            name,
+            client,
+            TokenBucket(rate or self.rate, burst or self.burst),
+            settings,
+            pinned=True,
+        )
+        with self._lock:
+            self.handles[name] = handle
+        return handle
+
+    def __contains__(self, name):
+        return name in self.handles or name in self.configs
+
+    def get(self, name):
+        """Handle of the account, None when the name is unknown."""
+        with self._lock:
+            handle = self.handles.get(name)
+            if handle is None:
+                config = self.configs.get(name)
+                if config is None:
+                    return None
+                handle = self.handles[name] = self._create(name, config)
+            handle.touch()
+            return handle
+
+    def _create(self, name, config):
+        config = dict(config)
+        rate = config.pop("rate", self.rate)
+        burst = config.pop("burst", self.burst)
+        kwargs = {arg: config.pop(arg) for arg in CLIENT_ARGS if arg in config}
+        client = self.factory(**kwargs)
+        client.clock = self.clock
+        # Parse the key now rather than on the first order
+        client.signer
+        logger.info(f"Account {name} created")
+        return AccountHandle(name, client, TokenBucket(rate, burst), config)
+
+    async def evict_idle(self):
+        now = time.monotonic()
+        with self._lock:
+            idle = [
+                handle
+                for handle in self.handles.values()
+                if not handle.pinned and now - handle.last_used > self.idle_timeout
+            ]
+            for handle in idle:
+                del self.handles[handle.name]
+
+        for handle in idle:
+            logger.info(f"Account {handle.name} evicted after being idle")
+            try:
+                await handle.close()
+            except Exception as e:
+                logger.error(f"Error thrown when closing account {handle.name}")
+                logger.error(e)
+        self.evicted += len(idle)
+        return len(idle)
+
+    async def run(self, interval=60.0):
+        while True:
+            await asyncio.sleep(interval)
+            await self.evict_idle()
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "configured": len(self.configs),
+                "evicted": self.evicted,
+                "active": {
+                    name: {
+                        "requests": handle.requests,
+                        "idle": now - handle.last_used,
+                        "tokens": handle.bucket.tokens,
+                        "connected": handle.client.connection is not None,
+                    }
+                    for name, handle in self.handles.items()
+                },
+            }
@@ -1,17 +1,37 @@
 import asyncio
+import contextvars
+import itertools
 import json
 import random
+import re
 import time
 import traceback
+from collections import OrderedDict
 
-import requests
-import websockets
-from eth_account import Account
 from eth_hash.auto import keccak
 from loguru import logger
-from web3 import Web3
 
 from eip712_structs import Address, Boolean, EIP712Struct, Uint, Bytes, make_domain
+from outbound import OutboundQueue
+from quantizer import Quantizer
+from risk import RiskRejected
+import metrics
+import tracing
+
+# Channel of a websocket message, found without decoding the whole frame
+CHANNEL_RE = re.compile(r'"channel"\s*:\s*"([^"]*)"')
+
+# Label handles of the metrics recorded per message or per command
+WS_MESSAGE_COUNTERS = metrics.LabelHandles(metrics.WS_MESSAGES)
+WS_SENT_COUNTERS = metrics.LabelHandles(metrics.ORDERS_SENT, "ws")
+REST_CREATE_SENT = metrics.ORDERS_SENT.labels("rest", "create_order")
+ACK_COUNTERS = metrics.LabelHandles(metrics.ORDER_ACKS)
+REJECT_COUNTERS = {
+    source: metrics.LabelHandles(metrics.ORDER_REJECTS, source)
+    for source in ("exchange", "risk")
+}
+# Ops of sent commands kept to label their responses, the oldest are dropped
+MAX_TRACKED_COMMANDS = 10000
 
 CONFIG = {
     "testnet": {
@@ -78,6 +98,8 @@ class AevoClient:
         api_secret="",
         env="testnet",
         rest_headers={},
+        rest_url=None,  # overrides of the env endpoints, e.g. a mock exchange
+        ws_url=None,
     ):
         self.signing_key = signing_key
         self.wallet_address = wallet_address
@@ -85,29 +107,94 @@ class AevoClient:
         self.api_key = api_key
         self.api_secret = api_secret
         self.connection = None
-        self.client = requests
+        self._reconnect_lock = asyncio.Lock()
+        self._client = None
+        self.session = None  # aiohttp session of the *_async REST calls
         self.rest_headers = {
             "AEVO-KEY": api_key,
             "AEVO-SECRET": api_secret,
         }
         self.extra_headers = None
+        self.subscriptions = []
+        self.outbound = None
+        self.oms = None
+        self.risk = None
+        self.clock = None  # ClockSync, see order_timestamp
+        self.quote_orders = {}  # (instrument_id, is_buy) -> order id, see mass_quote
+        self._command_ops = OrderedDict()  # request id -> op, see send_command
+        self._command_ids = itertools.count(int(time.time() * 1000))
+        self.quantizers = {}  # instrument_id -> Quantizer, see load_markets
+        self._default_quantizers = {}
+        self._domain = None
+        self._signer = (None, None)
         self.rest_headers.update(rest_headers)
 
         if (env != "testnet") and (env != "mainnet"):
             raise ValueError("env must either be 'testnet' or 'mainnet'")
         self.env = env
+        self._rest_url = rest_url
+        self._ws_url = ws_url
+
+    @property
+    def client(self):
+        # requests, eth_account, websockets and aiohttp are imported where they
+        # are first needed, a process that never uses them doesn't pay for it
+        if self._client is None:
+            import requests
+
+            self._client = requests.Session()
+            self._client.hooks["response"].append(self._on_http_response)
+        return self._client
+
+    def _on_http_response(self, response, *args, **kwargs):
+        # Every REST response samples the exchange clock through its Date header
+        if self.clock is not None and "Date" in response.headers:
+            received = time.time()
+            sent = received - response.elapsed.total_seconds()
+            self.clock.observe_date_header(sent, received, response.headers["Date"])
+
+    def order_timestamp(self):
+        """Seconds on the exchange clock when it is synced, the local one if not."""
+        if self.clock is not None:
+            return int(self.clock.now())
+        return int(time.time())
 
     @property
     def address(self):
+        from eth_account import Account
+
         return Account.from_key(self.signing_key).address
 
+    @property
+    def signer(self):
+        # Parsed once per key instead of on every signature
+        key, signer = self._signer
+        if key != self.signing_key or signer is None:
+            from eth_account import Account
+
+            signer = Account._parsePrivateKey(self.signing_key)
+            self._signer = (self.signing_key, signer)
+        return signer
+
+    def warmup(self):
+        """Does the one-off work of the first order ahead of time: imports the
+        signing and network modules, parses the key and builds the domain."""
+        import aiohttp
+        import websockets
+
+        self.client
+        if self.signing_key:
+            self.signer
+        if self._domain is None:
+            self._domain = make_domain(**self.signing_domain)
+
     @property
     def rest_url(self):
-        return CONFIG[self.env]["rest_url"]
+        return self._rest_url or CONFIG[self.env]["rest_url"]
 
     @property
     def ws_url(self):
-        return CONFIG[self.env]["ws_url"]
+        return self._ws_url or CONFIG[self.env]["ws_url"]
 
     @property
     def signing_domain(self):
@@ -116,6 +203,7 @@ class AevoClient:
     async def open_connection(self, extra_headers={}):
         try:
             logger.info("Opening Aevo websocket connection...")
+            import websockets
 
             self.connection = await websockets.connect(
                 self.ws_url, ping_interval=None, extra_headers=extra_headers
@@ -146,10 +234,48 @@ class AevoClient:
             logger.error(traceback.format_exc())
             await asyncio.sleep(10)  # Don't retry straight away
 
-    async def reconnect(self):
-        logger.info("Trying to reconnect Aevo websocket...")
+    async def _reopen_connection(self):
         await self.close_connection()
         await self.open_connection(self.extra_headers)
+        await self.resubscribe()
+
+    async def reconnect(self):
+        # The reader, send() and the outbound queue all reconnect on a failed
+        # socket, only the first of them replaces it
+        connection = self.connection
+        async with self._reconnect_lock:
+            if self.connection is not connection:
+                return
+
+            logger.info("Trying to reconnect Aevo websocket...")
+            metrics.WS_RECONNECTS.inc()
+            await self._reopen_connection()
+            # Commands and order state lost with the old socket are recovered
+            # here, clients reopening differently override _reopen_connection
+            if self.outbound:
+                await self.outbound.recover()
+            if self.oms:
+                # Runs inside read_messages' error handler, a failure here must
+                # not end the read loop
+                try:
+                    await self.oms.reconcile_async()
+                except Exception as e:
+                    logger.error("Error thrown when reconciling orders after reconnect")
+                    logger.error(e)
+                    logger.error(traceback.format_exc())
+
+    async def resubscribe(self):
+        if not self.subscriptions:
+            return
+
+        try:
+            await self.connection.send(
+                json.dumps({"op": "subscribe", "data": self.subscriptions})
+            )
+        except Exception as e:
+            logger.error("Error thrown when restoring subscriptions")
+            logger.error(e)
+            logger.error(traceback.format_exc())
 
     async def close_connection(self):
         try:
@@ -162,12 +288,19 @@ class AevoClient:
             logger.error(traceback.format_exc())
 
     async def read_messages(self, read_timeout=0.1, backoff=0.1, on_disconnect=None):
+        import websockets
+
         while True:
             try:
                 message = await asyncio.wait_for(
                     self.connection.recv(), timeout=read_timeout
                 )
+                self._record_message(message)
+                if self.outbound:
+                    self.outbound.on_message(message)
+                received = time.perf_counter()
                 yield message
+                metrics.READ_LAG.observe(time.perf_counter() - received)
             except (
                 websockets.exceptions.ConnectionClosedError,
                 websockets.exceptions.ConnectionClosedOK,
@@ -185,15 +318,84 @@ class AevoClient:
                 logger.error(traceback.format_exc())
                 await asyncio.sleep(1)
 
+    def _record_message(self, message):
+        metrics.WS_LAST_MESSAGE.set(time.time())
+        match = CHANNEL_RE.search(message)
+        if match:
+            WS_MESSAGE_COUNTERS[match.group(1)].inc()
+            return
+
+        # Command responses are few, only they are decoded here
+        WS_MESSAGE_COUNTERS["response"].inc()
+        try:
+            response = json.loads(message)
+        except ValueError:
+            return
+        if isinstance(response, dict):
+            op = self._command_ops.pop(response.get("id"), None)
+            self._record_response(response, op=op)
+
+    def _record_response(self, response, source="exchange", op="create_order"):
+        """Counts the response of an order command of ``op``, None when the
+        command was not tracked."""
+        if not isinstance(response, dict):
+            return
+        if response.get("error"):
+            REJECT_COUNTERS[source][response["error"]].inc()
+            return
+        if op is None:
+            # Not sent through send_command, only a returned order is an ack
+            data = response.get("data", response)
+            if not isinstance(data, dict) or not data.get("order_id"):
+                return
+            op = "unknown"
+        ACK_COUNTERS[op].inc()
+
+    def enable_outbound_queue(self, max_batch=50, ack_timeout=10.0, max_attempts=3):
+        # Must be called from the running event loop, see OutboundQueue
+        self.outbound = OutboundQueue(self, max_batch, ack_timeout, max_attempts)
+        self.outbound.start()
+        return self.outbound
+
     async def send(self, data):
+        if self.outbound:
+            self.outbound.enqueue(data)
+            return
+
         try:
             await self.connection.send(data)
-        except websockets.exceptions.ConnectionClosedError as e:
+        except Exception as e:
             logger.debug("Restarted Aevo websocket connection")
+            logger.debug(e)
             await self.reconnect()
-            await self.connection.send(data)
-        except:
-            await self.reconnect()
+            try:
+                await self.connection.send(data)
+            except Exception as e:
+                logger.error(f"Message lost after reconnect: {data}")
+                logger.error(e)
+                logger.error(traceback.format_exc())
+
+    def _track_command(self, payload):
+        # The response carries the request id only, remember what it answers
+        self._command_ops[payload["id"]] = payload.get("op")
+        if len(self._command_ops) > MAX_TRACKED_COMMANDS:
+            self._command_ops.popitem(last=False)
+
+    async def send_command(self, payload, order_id=None):
+        if order_id is not None:
+            WS_SENT_COUNTERS[payload.get("op")].inc()
+        # With the outbound queue the returned future resolves on the exchange ack
+        if self.outbound:
+            ack = self.outbound.enqueue_command(payload, order_id)
+            self._track_command(payload)
+            return ack
+
+        if "id" not in payload:
+            payload["id"] = next(self._command_ids)
+        self._track_command(payload)
+        frame = json.dumps(payload)
+        tracing.mark("serialize")
+        await self.send(frame)
 
     # Public REST API
     def get_index(self, asset):
@@ -201,45 +403,159 @@ class AevoClient:
         data = req.json()
         return data
 
-    def get_markets(self, asset):
-        req = self.client.get(f"{self.rest_url}/markets?asset={asset}")
+    def get_markets(self, asset=None):
+        url = f"{self.rest_url}/markets"
+        if asset:
+            url += f"?asset={asset}"
+        req = self.client.get(url)
         data = req.json()
         return data
 
+    def load_markets(self, asset):
+        """Build the quantizers of the asset's instruments from their market specs."""
+        markets = self.get_markets(asset)
+        for market in markets:
+            self.quantizers[int(market["instrument_id"])] = Quantizer.from_market(
+                market
+            )
+        return len(markets)
+
+    def quantizer(self, instrument_id, price_decimals=10**6, amount_decimals=10**6):
+        quantizer = self.quantizers.get(int(instrument_id))
+        if (
+            quantizer is not None
+            and quantizer.price_decimals == price_decimals
+            and quantizer.amount_decimals == amount_decimals
+        ):
+            return quantizer
+
+        # Instruments without loaded specs only get the fixed-point conversion
+        key = (price_decimals, amount_decimals)
+        quantizer = self._default_quantizers.get(key)
+        if quantizer is None:
+            quantizer = self._default_quantizers[key] = Quantizer(
+                price_decimals=price_decimals, amount_decimals=amount_decimals
+            )
+        return quantizer
+
     # Private REST API
-    def rest_create_order(
-        self, instrument_id, is_buy, limit_price, quantity, post_only=True
+    def _prepare_rest_order(
+        self, instrument_id, is_buy, limit_price, quantity, post_only
     ):
+        # Returns (rejected, payload, order_id, reserved margin)
+        reserved = 0.0
+        if self.risk:
+            rejected, reserved = self.risk.check_and_reserve(
+                instrument_id, is_buy, limit_price, quantity
+            )
+            if rejected:
+                logger.warning(f"Order rejected by pre-trade risk: {rejected}")
+                self._record_response(rejected, source="risk")
+                return rejected, None, None, reserved
+        tracing.mark("risk")
+
         data, order_id = self.create_order_rest_json(
             int(instrument_id), is_buy, limit_price, quantity, post_only
         )
+        tracing.bind_order(order_id)
+        REST_CREATE_SENT.inc()
         logger.info(data)
+        if self.oms:
+            self.oms.on_sent(order_id, instrument_id, is_buy, limit_price, quantity)
+        return None, data, order_id, reserved
+
+    def _on_rest_order_response(self, order_id, reserved, response):
+        self._record_response(response)
+        if self.oms:
+            self.oms.on_ack(order_id, response)
+        if self.risk:
+            self.risk.on_response(reserved, response)
+        return response
+
+    def rest_create_order(
+        self, instrument_id, is_buy, limit_price, quantity, post_only=True
+    ):
+        rejected, data, order_id, reserved = self._prepare_rest_order(
+            instrument_id, is_buy, limit_price, quantity, post_only
+        )
+        if rejected:
+            return rejected
+
+        tracing.mark("send")
         req = self.client.post(
             f"{self.rest_url}/orders", json=data, headers=self.rest_headers
         )
+        tracing.mark("ack")
         try:
-            return req.json()
+            response = req.json()
         except:
-            return req.text()
+            return req.text
+
+        return self._on_rest_order_response(order_id, reserved, response)
 
     def rest_create_market_order(self, instrument_id, is_buy, quantity):
-        limit_price = 0
-        if is_buy:
-            limit_price = 2**256 - 1
+        # A None limit price is quantized to the widest price of the side
+        return self.rest_create_order(
+            instrument_id, is_buy, None, quantity, post_only=False
+        )
 
-        data, order_id = self.create_order_rest_json(
-            int(instrument_id),
-            is_buy,
-            limit_price,
-            quantity,
-            price_decimals=1,
-            post_only=False,
+    async def _rest_request(self, method, path, payload=None):
+        if self.session is None or self.session.closed:
+            import aiohttp
+
+            self.session = aiohttp.ClientSession()
+        body = None
+        headers = self.rest_headers
+        if payload is not None:
+            body = json.dumps(payload)
+            headers = dict(headers, **{"Content-Type": "application/json"})
+            tracing.mark("serialize")
+
+        tracing.mark("send")
+        sent = time.time()
+        async with self.session.request(
+            method, f"{self.rest_url}{path}", data=body, headers=headers
+        ) as response:
+            tracing.mark("ack")
+            if self.clock is not None and "Date" in response.headers:
+                self.clock.observe_date_header(
+                    sent, time.time(), response.headers["Date"]
+                )
+            try:
+                return await response.json(content_type=None)
+            except ValueError:
+                return await response.text()
+
+    async def rest_create_order_async(
+        self, instrument_id, is_buy, limit_price, quantity, post_only=True
+    ):
+        rejected, data, order_id, reserved = self._prepare_rest_order(
+            instrument_id, is_buy, limit_price, quantity, post_only
         )
+        if rejected:
+            return rejected
 
-        req = self.client.post(
-            f"{self.rest_url}/orders", json=data, headers=self.rest_headers
+        response = await self._rest_request("POST", "/orders", payload=data)
+        return self._on_rest_order_response(order_id, reserved, response)
+
+    async def rest_create_market_order_async(self, instrument_id, is_buy, quantity):
+        return await self.rest_create_order_async(
+            instrument_id, is_buy, None, quantity, post_only=False
         )
-        return req.json()
+
+    async def rest_get_portfolio_async(self):
+        return await self._rest_request("GET", "/portfolio")
+
+    async def rest_get_positions_async(self):
+        return await self._rest_request("GET", "/positions")
+
+    async def rest_get_open_orders_async(self):
+        return await self._rest_request("GET", "/orders")
+
+    async def close_session(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
 
     def rest_cancel_order(self, order_id):
         req = self.client.delete(
@@ -256,6 +572,16 @@ class AevoClient:
         req = self.client.get(f"{self.rest_url}/portfolio", headers=self.rest_headers)
         return req.json()
 
+    def rest_get_positions(self):
+        req = self.client.get(f"{self.rest_url}/positions", headers=self.rest_headers)
+        return req.json()
+
+    def rest_get_order(self, order_id):
+        req = self.client.get(
+            f"{self.rest_url}/orders/{order_id}", headers=self.rest_headers
+        )
+        return req.json()
+
     def rest_get_open_orders(self):
         req = self.client.get(
             f"{self.rest_url}/orders", json={}, headers=self.rest_headers
@@ -307,72 +633,41 @@ class AevoClient:
             return req.text()
 
     # Public WS Subscriptions
+    async def subscribe(self, channels):
+        for channel in channels:
+            if channel not in self.subscriptions:
+                self.subscriptions.append(channel)
+
+        await self.send(json.dumps({"op": "subscribe", "data": channels}))
+
+    async def unsubscribe(self, channels):
+        self.subscriptions = [c for c in self.subscriptions if c not in channels]
+        await self.send(json.dumps({"op": "unsubscribe", "data": channels}))
+
     async def subscribe_tickers(self, asset):
-        await self.send(
-            json.dumps(
-                {
-                    "op": "subscribe",
-                    "data": [f"ticker:{asset}:OPTION"],
-                }
-            )
-        )
+        await self.subscribe([f"ticker:{asset}:OPTION"])
 
     async def subscribe_ticker(self, channel):
-        msg = json.dumps(
-            {
-                "op": "subscribe",
-                "data": [channel],
-            }
-        )
-        await self.send(msg)
+        await self.subscribe([channel])
 
     async def subscribe_markprice(self, asset):
-        await self.send(
-            json.dumps(
-                {
-                    "op": "subscribe",
-                    "data": [f"markprice:{asset}:OPTION"],
-                }
-            )
-        )
+        await self.subscribe([f"markprice:{asset}:OPTION"])
 
     async def subscribe_orderbook(self, instrument_name):
-        await self.send(
-            json.dumps(
-                {
-                    "op": "subscribe",
-                    "data": [f"orderbook:{instrument_name}"],
-                }
-            )
-        )
+        await self.subscribe([f"orderbook:{instrument_name}"])
 
     async def subscribe_trades(self, instrument_name):
-        await self.send(
-            json.dumps(
-                {
-                    "op": "subscribe",
-                    "data": [f"trades:{instrument_name}"],
-                }
-            )
-        )
+        await self.subscribe([f"trades:{instrument_name}"])
 
     async def subscribe_index(self, asset):
-        await self.send(json.dumps({"op": "subscribe", "data": [f"index:{asset}"]}))
+        await self.subscribe([f"index:{asset}"])
 
     # Private WS Subscriptions
     async def subscribe_orders(self):
-        payload = {
-            "op": "subscribe",
-            "data": ["orders"],
-        }
-        await self.send(json.dumps(payload))
+        await self.subscribe(["orders"])
 
     async def subscribe_fills(self):
-        payload = {
-            "op": "subscribe",
-            "data": ["fills"],
-        }
-        await self.send(json.dumps(payload))
+        await self.subscribe(["fills"])
 
     # Private WS Commands
     def create_order_ws_json(
@@ -386,22 +681,20 @@ class AevoClient:
         price_decimals=10**6,
         amount_decimals=10**6,
     ):
-        timestamp = int(time.time())
-        salt, signature, order_id = self.sign_order(
-            instrument_id=instrument_id,
-            is_buy=is_buy,
-            limit_price=limit_price,
-            quantity=quantity,
-            timestamp=timestamp,
-            price_decimals=price_decimals,
+        timestamp = self.order_timestamp()
+        price, amount = self.quantizer(
+            instrument_id, price_decimals, amount_decimals
+        ).scale(is_buy, limit_price, quantity)
+        salt, signature, order_id = self.sign_scaled_order(
+            instrument_id, is_buy, price, amount, timestamp
         )
 
         payload = {
             "instrument": instrument_id,
             "maker": self.wallet_address,
             "is_buy": is_buy,
-            "amount": str(int(round(quantity * amount_decimals, is_buy))),
-            "limit_price": str(int(round(limit_price * price_decimals, is_buy))),
+            "amount": str(amount),
+            "limit_price": str(price),
             "salt": str(salt),
             "signature": signature,
             "post_only": post_only,
@@ -424,21 +717,19 @@ class AevoClient:
         trigger=None,
         stop=None,
     ):
-        timestamp = int(time.time())
-        salt, signature, order_id = self.sign_order(
-            instrument_id=instrument_id,
-            is_buy=is_buy,
-            limit_price=limit_price,
-            quantity=quantity,
-            timestamp=timestamp,
-            price_decimals=price_decimals,
+        timestamp = self.order_timestamp()
+        price, amount = self.quantizer(
+            instrument_id, price_decimals, amount_decimals
+        ).scale(is_buy, limit_price, quantity)
+        salt, signature, order_id = self.sign_scaled_order(
+            instrument_id, is_buy, price, amount, timestamp
         )
         payload = {
             "maker": self.wallet_address,
             "is_buy": is_buy,
             "instrument": instrument_id,
-            "limit_price": str(int(round(limit_price * price_decimals, is_buy))),
-            "amount": str(int(round(quantity * amount_decimals, is_buy))),
+            "limit_price": str(price),
+            "amount": str(amount),
             "salt": str(salt),
             "signature": signature,
             "post_only": post_only,
@@ -461,7 +752,22 @@ class AevoClient:
         post_only=True,
         id=None,
         mmp=True,
+        ack=False,
     ):
+        """Send a new order, returns its id, or ``(order_id, ack)`` with
+        ``ack=True`` where ``ack`` resolves on the exchange response when the
+        outbound queue is enabled and is None otherwise. Raises RiskRejected
+        when pre-trade risk refuses the order, nothing is sent."""
+        if self.risk:
+            rejected, reserved = self.risk.check_and_reserve(
+                instrument_id, is_buy, limit_price, quantity
+            )
+            if rejected:
+                logger.warning(f"Order rejected by pre-trade risk: {rejected}")
+                self._record_response(rejected, source="risk")
+                raise RiskRejected(rejected)
+        tracing.mark("risk")
+
         data, order_id = self.create_order_ws_json(
             instrument_id=int(instrument_id),
             is_buy=is_buy,
@@ -475,9 +781,21 @@ class AevoClient:
             payload["id"] = id
 
         logger.info(payload)
-        await self.send(json.dumps(payload))
-
-        return order_id
+        if self.oms:
+            self.oms.on_sent(order_id, instrument_id, is_buy, limit_price, quantity)
+        tracing.bind_order(order_id)
+        trace = tracing.current_trace.get()
+        future = await self.send_command(payload, order_id)
+        if trace is not None:
+            trace.mark("send")
+            if future is not None:
+                future.add_done_callback(lambda f: trace.mark("ack"))
+        if self.oms and future is not None:
+            self.oms.watch_ack(order_id, future)
+        if self.risk and future is not None:
+            self.risk.watch_ack(reserved, future)
+
+        return (order_id, future) if ack else order_id
 
     async def edit_order(
         self,
@@ -489,40 +807,205 @@ class AevoClient:
         id=None,
         post_only=True,
         mmp=True,
+        price_decimals=10**6,
+        amount_decimals=10**6,
+        ack=False,
     ):
-        timestamp = int(time.time())
+        """Replace ``order_id``, returns the new order id, or
+        ``(new_order_id, ack)`` with ``ack=True`` as in ``create_order``."""
         instrument_id = int(instrument_id)
-        salt, signature, new_order_id = self.sign_order(
+        data, new_order_id = self.create_order_ws_json(
             instrument_id=instrument_id,
             is_buy=is_buy,
             limit_price=limit_price,
             quantity=quantity,
-            timestamp=timestamp,
+            post_only=post_only,
+            mmp=mmp,
+            price_decimals=price_decimals,
+            amount_decimals=amount_decimals,
         )
-        payload = {
-            "op": "edit_order",
-            "data": {
-                "order_id": order_id,
-                "instrument": instrument_id,
-                "maker": self.wallet_address,
-                "is_buy": is_buy,
-                "amount": str(int(round(quantity * 10**6, is_buy))),
-                "limit_price": str(int(round(limit_price * 10**6, is_buy))),
-                "salt": str(salt),
-                "signature": signature,
-                "post_only": post_only,
-                "mmp": mmp,
-                "timestamp": timestamp,
-            },
-        }
+        payload = {"op": "edit_order", "data": {"order_id": order_id, **data}}
 
         if id:
             payload["id"] = id
 
         logger.info(payload)
-        await self.send(json.dumps(payload))
+        if self.oms:
+            self.oms.on_sent(
+                new_order_id,
+                instrument_id,
+                is_buy,
+                limit_price,
+                quantity,
+                replaces=order_id,
+            )
+        future = await self.send_command(payload, new_order_id)
+        if self.oms and future is not None:
+            self.oms.watch_ack(new_order_id, future)
+
+        return (new_order_id, future) if ack else new_order_id
+
+    async def mass_quote(
+        self,
+        updates,
+        post_only=True,
+        mmp=True,
+        price_decimals=10**6,
+        amount_decimals=10**6,
+    ):
+        """Requote many instruments at once.
+
+        ``updates`` are ``(instrument_id, bid, ask, sizes)`` tuples, ``sizes`` is
+        one size for both sides or a ``(bid_size, ask_size)`` pair. Each side
+        edits the quote left by the previous call or creates a new one, a None
+        price cancels it. New quotes rejected by pre-trade risk are not sent and
+        carry the rejection as their response. All legs are signed in parallel
+        on the default executor and sent back to back. With the outbound queue
+        enabled the acks are awaited together and every leg's result carries
+        its response and its own ack time.
+        """
+        legs = []
+        for instrument_id, bid, ask, sizes in updates:
+            if not isinstance(sizes, (tuple, list)):
+                sizes = (sizes, sizes)
+            for is_buy, price, size in ((True, bid, sizes[0]), (False, ask, sizes[1])):
+                legs.append((int(instrument_id), is_buy, price, size))
+
+        def sign(instrument_id, is_buy, price, size):
+            started = time.perf_counter()
+            data, order_id = self.create_order_ws_json(
+                instrument_id=instrument_id,
+                is_buy=is_buy,
+                limit_price=price,
+                quantity=size,
+                post_only=post_only,
+                mmp=mmp,
+                price_decimals=price_decimals,
+                amount_decimals=amount_decimals,
+            )
+            return data, order_id, time.perf_counter() - started
+
+        # New quotes add exposure and go through pre-trade risk, edits and
+        # cancels replace an order that already passed it
+        quoted = []
+        rejected = {}
+        reserved = {}
+        for leg in legs:
+            instrument_id, is_buy, price, size = leg
+            if price is None or not size:
+                continue
+            if self.risk and (instrument_id, is_buy) not in self.quote_orders:
+                error, reserved[leg] = self.risk.check_and_reserve(*leg)
+                if error:
+                    self._record_response(error, source="risk")
+                    rejected[leg] = error
+                    continue
+            quoted.append(leg)
+
+        # Signed in a copy of this context, the traces of the legs are kept
+        loop = asyncio.get_running_loop()
+        try:
+            signed = await asyncio.gather(
+                *(
+                    loop.run_in_executor(
+                        None, contextvars.copy_context().run, sign, *leg
+                    )
+                    for leg in quoted
+                )
+            )
+        except BaseException:
+            # Nothing is sent, no ack will release the reservations
+            for amount in reserved.values():
+                self.risk.release(amount)
+            raise
+        signed = dict(zip(quoted, signed))
+
+        results = []
+        acks = []
+        for leg in legs:
+            instrument_id, is_buy, price, size = leg
+            key = (instrument_id, is_buy)
+            replaces = self.quote_orders.get(key)
+            result = {
+                "instrument_id": instrument_id,
+                "side": "buy" if is_buy else "sell",
+                "op": None,
+                "price": price,
+                "amount": size,
+                "replaces": replaces,
+                "order_id": None,
+                "sign_ms": None,
+                "ack_ms": None,
+                "response": None,
+            }
+            results.append(result)
+
+            if leg in rejected:
+                result["op"] = "create_order"
+                result["response"] = rejected[leg]
+                continue
+            if leg not in signed:
+                if replaces is None:
+                    continue
+                result["op"] = "cancel_order"
+                payload = {"op": "cancel_order", "data": {"order_id": replaces}}
+                order_id = replaces
+                self.quote_orders.pop(key, None)
+            else:
+                data, order_id, elapsed = signed[leg]
+                result["sign_ms"] = elapsed * 1000
+                if replaces is None:
+                    result["op"] = "create_order"
+                    payload = {"op": "create_order", "data": data}
+                else:
+                    result["op"] = "edit_order"
+                    payload = {
+                        "op": "edit_order",
+                        "data": {"order_id": replaces, **data},
+                    }
+                if self.oms:
+                    self.oms.on_sent(
+                        order_id, instrument_id, is_buy, price, size, replaces=replaces
+                    )
+                self.quote_orders[key] = order_id
 
-        return new_order_id
+            result["order_id"] = order_id
+            sent_at = time.perf_counter()
+            try:
+                ack = await self.send_command(payload, order_id)
+            except BaseException:
+                # This leg and the ones after it are not sent
+                for amount in reserved.values():
+                    self.risk.release(amount)
+                raise
+            # Released by a rejecting ack, without the outbound queue there is
+            # none and the next margin refresh replaces the reservation
+            held = reserved.pop(leg, 0.0)
+            if ack is not None:
+                # Timed when this leg's ack lands, not when the slowest one does
+                ack.add_done_callback(
+                    lambda f, result=result, sent_at=sent_at: result.update(
+                        ack_ms=(time.perf_counter() - sent_at) * 1000
+                    )
+                )
+                if self.oms and result["op"] != "cancel_order":
+                    self.oms.watch_ack(order_id, ack)
+                if self.risk and result["op"] == "create_order":
+                    self.risk.watch_ack(held, ack)
+                acks.append((result, key, ack))
+
+        if acks:
+            responses = await asyncio.gather(*(ack for _, _, ack in acks))
+            for (result, key, _), response in zip(acks, responses):
+                result["response"] = response
+                if response.get("error") and result["op"] != "cancel_order":
+                    # A rejected edit leaves the previous order standing
+                    if result["replaces"] is None:
+                        self.quote_orders.pop(key, None)
+                    else:
+                        self.quote_orders[key] = result["replaces"]
+
+        return results
 
     async def cancel_order(self, order_id):
         if not order_id:
@@ -530,11 +1013,11 @@ class AevoClient:
 
         payload = {"op": "cancel_order", "data": {"order_id": order_id}}
         logger.info(payload)
-        await self.send(json.dumps(payload))
+        return await self.send_command(payload, order_id)
 
     async def cancel_all_orders(self):
         payload = {"op": "cancel_all_orders", "data": {}}
-        await self.send(json.dumps(payload))
+        await self.send_command(payload)
 
     def sign_order(
         self,
@@ -546,25 +1029,35 @@ class AevoClient:
         price_decimals=10**6,
         amount_decimals=10**6,
     ):
+        price, amount = self.quantizer(
+            instrument_id, price_decimals, amount_decimals
+        ).scale(is_buy, limit_price, quantity)
+        return self.sign_scaled_order(instrument_id, is_buy, price, amount, timestamp)
+
+    def sign_scaled_order(self, instrument_id, is_buy, limit_price, amount, timestamp):
+        """Sign an order whose price and amount are already scaled integers."""
+        from eth_account import Account
+
+        started = time.perf_counter()
         salt = random.randint(0, 10**10)  # We just need a large enough number
 
         order_struct = Order(
             maker=self.wallet_address,  # The wallet"s main address
             isBuy=is_buy,
-            limitPrice=int(round(limit_price * price_decimals, is_buy)),
-            amount=int(round(quantity * amount_decimals, is_buy)),
+            limitPrice=limit_price,
+            amount=amount,
             salt=salt,
             instrument=instrument_id,
             timestamp=timestamp,
         )
-        logger.info(self.signing_domain)
-        domain = make_domain(**self.signing_domain)
-        signable_bytes = keccak(order_struct.signable_bytes(domain=domain))
-        return (
-            salt,
-            Account._sign_hash(signable_bytes, self.signing_key).signature.hex(),
-            f"0x{signable_bytes.hex()}",
-        )
+        if self._domain is None:
+            logger.info(self.signing_domain)
+            self._domain = make_domain(**self.signing_domain)
+        signable_bytes = keccak(order_struct.signable_bytes(domain=self._domain))
+        signature = Account._sign_hash(signable_bytes, self.signer).signature.hex()
+        metrics.SIGN_SECONDS.observe(time.perf_counter() - started)
+        tracing.mark("sign")
+        return salt, signature, f"0x{signable_bytes.hex()}"
 
     def create_withdraw(self, collateral, to, amount, data, amount_decimals):
         if data == None:
@@ -590,6 +1083,8 @@ class AevoClient:
         return payload, withdraw_id
 
     def sign_withdraw(self, collateral, to, amount, data, amount_decimals):
+        from eth_account import Account
+
         salt = random.randint(0, 10**10)  # We just need a large enough number
 
         withdraw_struct = Withdraw(
@@ -0,0 +1,126 @@
+"""
+Cold-start benchmark: time to import the SDK and the webhook process.
+
+    python bench_startup.py --runs 7 --budget aevo=400 --budget trade=800
+
+Each run imports the module in a fresh interpreter with ``-X importtime``.
+The median total is compared with the module's budget in ms, and the exit
+code is 1 when a budget is exceeded, so it can gate a deploy or CI job.
+``trade`` exits on import without a signing key, the runs see a stub
+keys.py unless a keys module comes first on the caller's PYTHONPATH.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Median import time budgets in ms, measured with web3 out of the import path
+BUDGETS = {"aevo": 400.0, "trade": 800.0}
+
+# Config of the benchmark runs, a throwaway key that never signs anything
+STUB_KEYS = """\
+signing_key = "0x" + "11" * 32
+wallet_address = "0x0000000000000000000000000000000000000001"
+api_key = ""
+api_secret = ""
+instrument_id = 1
+quantity = 1
+"""
+
+
+def import_times(module, cwd, stub):
+    """Cumulative import time in ms of every module imported by ``module``."""
+    path = [os.environ.get("PYTHONPATH"), stub, ROOT]
+    env = dict(
+        os.environ,
+        # A PYTHONPATH of the caller comes first, e.g. the deploy's keys.py,
+        # then the stub config ahead of the repo's keys.py
+        PYTHONPATH=os.pathsep.join(filter(None, path)),
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=cwd,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        errors = [
+            line
+            for line in result.stderr.splitlines()
+            if not line.startswith("import time:")
+        ]
+        raise RuntimeError(f"import {module} failed:\n" + "\n".join(errors[-20:]))
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        # Indentation marks nesting, the last top level entry is the module itself
+        times[name.strip()] = int(cumulative) / 1000
+    return times
+
+
+def bench(module, runs=5, top=10):
+    # Runs in a scratch directory, trade.py creates app.log in the cwd
+    with tempfile.TemporaryDirectory() as cwd:
+        stub = os.path.join(cwd, "stub")
+        os.mkdir(stub)
+        with open(os.path.join(stub, "keys.py"), "w") as f:
+            f.write(STUB_KEYS)
+        samples = [import_times(module, cwd, stub) for _ in range(runs)]
+    totals = [sample.get(module, 0.0) for sample in samples]
+    names = set().union(*samples)
+    heaviest = sorted(
+        (
+            (statistics.median(s.get(name, 0.0) for s in samples), name)
+            for name in names
+            if name != module
+        ),
+        reverse=True,
+    )[:top]
+    return statistics.median(totals), heaviest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time benchmark")
+    parser.add_argument("modules", nargs="*", default=list(BUDGETS))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument(
+        "--budget",
+        action="append",
+        default=[],
+        metavar="MODULE=MS",
+        help="overrides the default budget of a module",
+    )
+    args = parser.parse_args()
+
+    budgets = dict(BUDGETS)
+    for budget in args.budget:
+        module, ms = budget.split("=")
+        budgets[module] = float(ms)
+
+    failed = False
+    for module in args.modules:
+        median, heaviest = bench(module, args.runs, args.top)
+        budget = budgets.get(module)
+        status = "ok"
+        if budget is not None and median > budget:
+            status = "OVER BUDGET"
+            failed = True
+        print(f"{module}: {median:.0f} ms (budget {budget or '-'} ms) {status}")
+        for ms, name in heaviest:
+            print(f"    {ms:8.1f} ms  {name}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
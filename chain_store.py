@@ -0,0 +1,185 @@
+import json
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Aevo options expire at 08:00 UTC on the expiry date
+EXPIRY_HOUR = 8
+
+# Per-row quote fields, one float64 column each
+QUOTE_FIELDS = (
+    "bid",
+    "bid_amount",
+    "bid_iv",
+    "ask",
+    "ask_amount",
+    "ask_iv",
+    "mark",
+    "iv",
+    "delta",
+    "gamma",
+    "vega",
+    "theta",
+    "rho",
+    "index",
+)
+
+GREEKS = ("delta", "gamma", "vega", "theta", "rho", "iv")
+
+
+def parse_option_name(instrument_name):
+    """Split ``ETH-30JUN23-1600-C`` into (asset, expiry timestamp, strike, is_call)."""
+    asset, expiry, strike, option_type = instrument_name.split("-")
+    expiry = datetime.strptime(expiry, "%d%b%y").replace(
+        hour=EXPIRY_HOUR, tzinfo=timezone.utc
+    )
+    return asset, int(expiry.timestamp()), float(strike), option_type == "C"
+
+
+class OptionChainStore:
+    """Columnar store of a whole option chain fed by ``ticker:`` and ``markprice:`` streams.
+
+    Every field is a NumPy array indexed by row, rows are assigned per instrument
+    id on first sight and updated in place, so chain-wide queries are vectorized.
+    """
+
+    def __init__(self, capacity=512):
+        self.capacity = capacity
+        self.size = 0
+        self.rows = {}
+        self.instrument_ids = []
+        self.instrument_names = []
+        self.expiry = np.zeros(capacity, dtype=np.int64)
+        self.strike = np.full(capacity, np.nan)
+        self.is_call = np.zeros(capacity, dtype=bool)
+        self.updated = np.zeros(capacity, dtype=np.int64)
+        self.columns = {field: np.full(capacity, np.nan) for field in QUOTE_FIELDS}
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self):
+        extra = self.capacity
+        self.expiry = np.concatenate([self.expiry, np.zeros(extra, dtype=np.int64)])
+        self.strike = np.concatenate([self.strike, np.full(extra, np.nan)])
+        self.is_call = np.concatenate([self.is_call, np.zeros(extra, dtype=bool)])
+        self.updated = np.concatenate([self.updated, np.zeros(extra, dtype=np.int64)])
+        for field, column in self.columns.items():
+            self.columns[field] = np.concatenate([column, np.full(extra, np.nan)])
+        self.capacity += extra
+
+    def row(self, instrument_id, instrument_name=None):
+        instrument_id = str(instrument_id)
+        row = self.rows.get(instrument_id)
+        if row is not None or instrument_name is None:
+            return row
+
+        if self.size == self.capacity:
+            self._grow()
+
+        row = self.size
+        self.size += 1
+        self.rows[instrument_id] = row
+        self.instrument_ids.append(instrument_id)
+        self.instrument_names.append(instrument_name)
+        try:
+            _, expiry, strike, is_call = parse_option_name(instrument_name)
+            self.expiry[row] = expiry
+            self.strike[row] = strike
+            self.is_call[row] = is_call
+        except ValueError:
+            # Perpetuals and spot share the store but have no strike or expiry
+            pass
+        return row
+
+    def handle(self, message):
+        if isinstance(message, (str, bytes)):
+            message = json.loads(message)
+
+        channel = message.get("channel") or ""
+        data = message.get("data") or {}
+        if channel.startswith("ticker:"):
+            self.apply_tickers(data)
+        elif channel.startswith("markprice:"):
+            self.apply_markprices(data)
+
+    def apply_tickers(self, data):
+        timestamp = int(data.get("timestamp") or 0)
+        columns = self.columns
+        for ticker in data.get("tickers") or ():
+            row = self.row(ticker["instrument_id"], ticker.get("instrument_name"))
+            if row is None:
+                continue
+
+            for side in ("bid", "ask"):
+                quote = ticker.get(side)
+                if quote:
+                    columns[side][row] = float(quote.get("price") or "nan")
+                    columns[f"{side}_amount"][row] = float(quote.get("amount") or 0)
+                    columns[f"{side}_iv"][row] = float(quote.get("iv") or "nan")
+
+            mark = ticker.get("mark")
+            if mark:
+                columns["mark"][row] = float(mark.get("price") or "nan")
+                for greek, value in (mark.get("greeks") or {}).items():
+                    if greek in GREEKS:
+                        columns[greek][row] = float(value)
+
+            if "index_price" in ticker:
+                columns["index"][row] = float(ticker["index_price"])
+            self.updated[row] = timestamp
+
+    def apply_markprices(self, data):
+        timestamp = int(data.get("timestamp") or 0)
+        mark = self.columns["mark"]
+        for price in data.get("prices") or ():
+            row = self.row(price["instrument_id"], price.get("instrument_name"))
+            if row is None:
+                continue
+            mark[row] = float(price["mark_price"])
+            self.updated[row] = timestamp
+
+    def column(self, field):
+        if field == "expiry":
+            return self.expiry[: self.size]
+        if field == "strike":
+            return self.strike[: self.size]
+        if field == "is_call":
+            return self.is_call[: self.size]
+        if field == "updated":
+            return self.updated[: self.size]
+        return self.columns[field][: self.size]
+
+    def mask(
+        self,
+        expiry=None,
+        strike_min=None,
+        strike_max=None,
+        delta_min=None,
+        delta_max=None,
+        is_call=None,
+    ):
+        """Boolean mask over the chain rows, every given bound must hold."""
+        mask = np.ones(self.size, dtype=bool)
+        if expiry is not None:
+            mask &= self.column("expiry") == expiry
+        if strike_min is not None:
+            mask &= self.column("strike") >= strike_min
+        if strike_max is not None:
+            mask &= self.column("strike") <= strike_max
+        if delta_min is not None:
+            mask &= self.column("delta") >= delta_min
+        if delta_max is not None:
+            mask &= self.column("delta") <= delta_max
+        if is_call is not None:
+            mask &= self.column("is_call") == is_call
+        return mask
+
+    def select(self, fields, **bounds):
+        """Rows matching ``bounds`` (see ``mask``) as instrument ids plus field arrays."""
+        rows = np.flatnonzero(self.mask(**bounds))
+        ids = [self.instrument_ids[row] for row in rows]
+        return ids, {field: self.column(field)[rows] for field in fields}
+
+    def expiries(self):
+        return np.unique(self.column("expiry"))
@@ -0,0 +1,201 @@
+import asyncio
+import json
+from collections import deque
+
+CONFLATE = "conflate"
+LOSSLESS = "lossless"
+DROP_OLDEST = "drop_oldest"
+
+# Channel prefix -> policy, first match wins
+DEFAULT_POLICIES = (
+    ("ticker:", CONFLATE),
+    ("markprice:", CONFLATE),
+    ("fills", LOSSLESS),
+    ("orders", LOSSLESS),
+)
+
+# Command responses and subscription confirmations have no channel
+RESPONSE_CHANNEL = "response"
+
+# Per-instrument lists inside snapshot messages, merged entry by entry when conflating
+CONFLATED_LISTS = ("tickers", "prices")
+
+
+class ChannelStats:
+    def __init__(self):
+        self.enqueued = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.conflated = 0
+        self.blocked = 0
+        self.high_watermark = 0
+
+
+class _ConflatedSlot:
+    def __init__(self):
+        self.message = None
+        self.entries = {}
+        self.pending = False
+
+    def merge(self, message):
+        data = message.get("data")
+        if isinstance(data, dict):
+            for field in CONFLATED_LISTS:
+                items = data.get(field)
+                if isinstance(items, list):
+                    for item in items:
+                        key = item.get("instrument_id") or item.get("instrument_name")
+                        # Newer snapshot of an instrument replaces the queued one
+                        self.entries[(field, key)] = item
+        self.message = message
+
+    def take(self):
+        message = self.message
+        if self.entries:
+            data = dict(message["data"])
+            for field in CONFLATED_LISTS:
+                if field in data:
+                    data[field] = [
+                        item
+                        for (entry_field, _), item in self.entries.items()
+                        if entry_field == field
+                    ]
+            message = dict(message, data=data)
+
+        self.message = None
+        self.entries = {}
+        self.pending = False
+        return message
+
+
+class ChannelQueues:
+    """Bounded queues between the websocket reader and consumers, one per channel.
+
+    Ticker and mark-price channels are conflated so consumers only see the newest
+    snapshot of each instrument, fills and orders are lossless (the reader waits
+    for space), everything else drops its oldest message when full.
+    """
+
+    def __init__(
+        self, maxsize=1000, policies=DEFAULT_POLICIES, default_policy=DROP_OLDEST
+    ):
+        self.maxsize = maxsize
+        self.policies = policies
+        self.default_policy = default_policy
+        self.stats = {}
+        self._policy = {}
+        self._queues = {}
+        self._slots = {}
+        self._order = deque()
+        self._readable = asyncio.Event()
+        self._drained = asyncio.Event()
+
+    def policy(self, channel):
+        policy = self._policy.get(channel)
+        if policy is None:
+            policy = self.default_policy
+            for prefix, prefix_policy in self.policies:
+                if channel.startswith(prefix):
+                    policy = prefix_policy
+                    break
+            self._policy[channel] = policy
+            self.stats[channel] = ChannelStats()
+        return policy
+
+    async def put(self, message):
+        if isinstance(message, (str, bytes)):
+            message = json.loads(message)
+
+        channel = message.get("channel") or RESPONSE_CHANNEL
+        policy = self.policy(channel)
+        stats = self.stats[channel]
+        stats.enqueued += 1
+
+        if policy == CONFLATE:
+            slot = self._slots.get(channel)
+            if slot is None:
+                slot = self._slots[channel] = _ConflatedSlot()
+            if slot.pending:
+                stats.conflated += 1
+            else:
+                slot.pending = True
+                self._order.append(channel)
+            slot.merge(message)
+            stats.high_watermark = max(stats.high_watermark, 1)
+        else:
+            queue = self._queues.get(channel)
+            if queue is None:
+                queue = self._queues[channel] = deque()
+
+            if len(queue) >= self.maxsize:
+                if policy == LOSSLESS:
+                    stats.blocked += 1
+                    while len(queue) >= self.maxsize:
+                        self._drained.clear()
+                        await self._drained.wait()
+                    self._order.append(channel)
+                else:
+                    queue.popleft()
+                    stats.dropped += 1
+            else:
+                self._order.append(channel)
+
+            queue.append(message)
+            stats.high_watermark = max(stats.high_watermark, len(queue))
+
+        self._readable.set()
+
+    def get_nowait(self):
+        while self._order:
+            channel = self._order.popleft()
+            slot = self._slots.get(channel)
+            if slot is not None:
+                message = slot.take()
+            else:
+                queue = self._queues[channel]
+                if not queue:
+                    continue
+                message = queue.popleft()
+                self._drained.set()
+
+            self.stats[channel].delivered += 1
+            return message
+
+        self._readable.clear()
+        return None
+
+    async def get(self):
+        while True:
+            message = self.get_nowait()
+            if message is not None:
+                return message
+            await self._readable.wait()
+
+    async def messages(self):
+        while True:
+            yield await self.get()
+
+    async def pump(self, messages):
+        async for message in messages:
+            await self.put(message)
+
+    def depth(self, channel):
+        slot = self._slots.get(channel)
+        if slot is not None:
+            return int(slot.pending)
+        return len(self._queues.get(channel, ()))
+
+    def metrics(self):
+        return {
+            channel: {
+                "policy": self._policy[channel],
+                "depth": self.depth(channel),
+                "high_watermark": stats.high_watermark,
+                "enqueued": stats.enqueued,
+                "delivered": stats.delivered,
+                "dropped": stats.dropped,
+                "conflated": stats.conflated,
+                "blocked": stats.blocked,
+            }
+            for channel, stats in self.stats.items()
+        }
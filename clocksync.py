@@ -0,0 +1,132 @@
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+
+from loguru import logger
+
+
+class ClockSync:
+    """Estimate of the exchange clock relative to the local one.
+
+    Every request/response pair bounds the server time to the round trip:
+    the sample offset is taken at the midpoint and is off by at most half
+    the RTT, plus half the resolution of the timestamp (one second for the
+    HTTP ``Date`` header). The estimate is the sample with the smallest
+    error among the recent ones, so queueing delays don't bias it.
+    Websocket timestamps were stamped before the message reached us and
+    only give a lower bound of the offset, which the estimate is kept above.
+
+    Sets ``client.clock``, order timestamps then come from ``now()``.
+    """
+
+    def __init__(self, client=None, window=64, max_age=600.0, sync_interval=60.0):
+        self.client = client
+        self.window = window
+        self.max_age = max_age
+        self.sync_interval = sync_interval
+        self.samples = deque(maxlen=window)  # (local time, offset, error)
+        self.lower_bounds = deque(maxlen=window)  # (local time, offset bound)
+        self.offset = 0.0
+        self.uncertainty = None  # None until the first sample
+        self._lock = threading.Lock()
+        if client is not None:
+            client.clock = self
+
+    def now(self):
+        """Exchange time in seconds."""
+        return time.time() + self.offset
+
+    def observe(self, sent, received, server_time, resolution=0.0):
+        """Adds a sample from a request sent and answered at local ``sent`` and
+        ``received``, stamped ``server_time`` by the exchange (all seconds)."""
+        rtt = received - sent
+        if rtt < 0:
+            return
+        offset = server_time + resolution / 2 - (sent + received) / 2
+        with self._lock:
+            self.samples.append((received, offset, rtt / 2 + resolution / 2))
+            self._estimate(received)
+
+    def observe_one_way(self, received, server_time):
+        """Adds a message stamped ``server_time`` before it was sent to us."""
+        with self._lock:
+            self.lower_bounds.append((received, server_time - received))
+            if self.uncertainty is not None:
+                self._estimate(received)
+
+    def observe_date_header(self, sent, received, date):
+        try:
+            server_time = parsedate_to_datetime(date).timestamp()
+        except (TypeError, ValueError):
+            return
+        # The header is truncated to the second, the true time is up to 1s later
+        self.observe(sent, received, server_time, resolution=1.0)
+
+    def _estimate(self, now):
+        while self.samples and now - self.samples[0][0] > self.max_age:
+            self.samples.popleft()
+        while self.lower_bounds and now - self.lower_bounds[0][0] > self.max_age:
+            self.lower_bounds.popleft()
+        if not self.samples:
+            return
+
+        _, offset, error = min(self.samples, key=lambda sample: sample[2])
+        if self.lower_bounds:
+            bound = max(offset for _, offset in self.lower_bounds)
+            if bound > offset:
+                # The round trip sample is stale or the clock drifted since
+                error = max(error - (bound - offset), 0.0)
+                offset = bound
+        self.offset = offset
+        self.uncertainty = error
+
+    def handle(self, message):
+        if isinstance(message, (str, bytes)):
+            # Cheap check before decoding, only fills carry an exchange time
+            if '"fills"' not in message:
+                return
+            message = json.loads(message)
+
+        if message.get("channel") != "fills":
+            return
+        fill = (message.get("data") or {}).get("fill") or {}
+        created = fill.get("created_timestamp")
+        if created:
+            self.observe_one_way(time.time(), int(created) / 1e9)
+
+    async def sync_async(self, asset="ETH"):
+        """Samples the clock with the public index endpoint, its body carries
+        the exchange time in ns on top of the Date header."""
+        sent = time.time()
+        response = await self.client._rest_request("GET", f"/index?asset={asset}")
+        received = time.time()
+        if isinstance(response, dict) and response.get("timestamp"):
+            self.observe(sent, received, int(response["timestamp"]) / 1e9)
+        return self.offset
+
+    async def run(self, asset="ETH", samples=5):
+        while True:
+            try:
+                # Several samples in a row, the fastest round trip wins
+                for _ in range(samples):
+                    await self.sync_async(asset)
+                logger.debug(
+                    f"Clock offset {self.offset * 1000:.1f} ms "
+                    f"+- {(self.uncertainty or 0) * 1000:.1f} ms"
+                )
+            except Exception as e:
+                logger.error("Error thrown when syncing the exchange clock")
+                logger.error(e)
+            await asyncio.sleep(self.sync_interval)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "offset": self.offset,
+                "uncertainty": self.uncertainty,
+                "samples": len(self.samples),
+                "lower_bounds": len(self.lower_bounds),
+            }
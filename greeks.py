@@ -0,0 +1,199 @@
+import time
+
+import numpy as np
+
+YEAR_SECONDS = 365 * 86400
+
+MIN_VOL = 1e-4
+MAX_VOL = 5.0
+
+OUTPUTS = ("iv", "delta", "gamma", "vega", "theta")
+
+
+def norm_cdf(x):
+    # Abramowitz & Stegun 26.2.17, absolute error below 7.5e-8
+    t = 1.0 / (1.0 + 0.2316419 * np.abs(x))
+    poly = t * (
+        0.319381530
+        + t * (-0.356563782 + t * (1.781477937 + t * (-1.821255978 + t * 1.330274429)))
+    )
+    tail = norm_pdf(x) * poly
+    return np.where(x >= 0, 1.0 - tail, tail)
+
+
+def norm_pdf(x):
+    return np.exp(-0.5 * x * x) / np.sqrt(2 * np.pi)
+
+
+def black76_price(forward, strike, years, vol, is_call, rate=0.0):
+    sqrt_t = np.sqrt(years)
+    d1 = (np.log(forward / strike) + 0.5 * vol * vol * years) / (vol * sqrt_t)
+    d2 = d1 - vol * sqrt_t
+    discount = np.exp(-rate * years)
+    call = discount * (forward * norm_cdf(d1) - strike * norm_cdf(d2))
+    put = discount * (strike * norm_cdf(-d2) - forward * norm_cdf(-d1))
+    return np.where(is_call, call, put)
+
+
+def black76_vega(forward, strike, years, vol, rate=0.0):
+    sqrt_t = np.sqrt(years)
+    d1 = (np.log(forward / strike) + 0.5 * vol * vol * years) / (vol * sqrt_t)
+    return np.exp(-rate * years) * forward * norm_pdf(d1) * sqrt_t
+
+
+def implied_vol(
+    price, forward, strike, years, is_call, rate=0.0, tol=1e-8, newton_steps=20
+):
+    """Black-76 implied volatility of every row at once.
+
+    Vectorized Newton steps first, rows that do not converge (tiny vega far
+    from the money) are finished by bisection. Prices outside the no-arbitrage
+    bounds give NaN.
+    """
+    price, forward, strike, years, is_call = np.broadcast_arrays(
+        *(np.asarray(a, dtype=float) for a in (price, forward, strike, years, is_call))
+    )
+    is_call = is_call.astype(bool)
+    discount = np.exp(-rate * years)
+    intrinsic = discount * np.maximum(
+        np.where(is_call, forward - strike, strike - forward), 0
+    )
+    upper = discount * np.where(is_call, forward, strike)
+    valid = (price > intrinsic) & (price < upper) & (years > 0)
+
+    # Brenner-Subrahmanyam start, good near the money
+    vol = np.sqrt(2 * np.pi / np.where(years > 0, years, 1)) * price / forward
+    vol = np.clip(np.where(np.isfinite(vol), vol, 0.5), 0.05, 2.0)
+    done = ~valid
+    solved = np.zeros(vol.shape, dtype=bool)
+    for _ in range(newton_steps):
+        active = ~done
+        if not active.any():
+            break
+        f, k, t, c = forward[active], strike[active], years[active], is_call[active]
+        v = vol[active]
+        diff = black76_price(f, k, t, v, c, rate) - price[active]
+        vega = black76_vega(f, k, t, v, rate)
+        flat = vega <= 1e-12
+        step = np.where(flat, 0.0, diff / np.where(flat, 1.0, vega))
+        vol[active] = np.clip(v - step, MIN_VOL, MAX_VOL)
+        converged = ~flat & (
+            (np.abs(diff) < tol * np.maximum(price[active], 1e-12))
+            | (np.abs(step) < tol)
+        )
+        done[active] = converged | flat
+        solved[active] = converged
+
+    unsolved = valid & ~solved
+    if unsolved.any():
+        f, k, t, c = (
+            forward[unsolved],
+            strike[unsolved],
+            years[unsolved],
+            is_call[unsolved],
+        )
+        p = price[unsolved]
+        low = np.full(p.shape, MIN_VOL)
+        high = np.full(p.shape, MAX_VOL)
+        for _ in range(60):
+            mid = 0.5 * (low + high)
+            above = black76_price(f, k, t, mid, c, rate) > p
+            high = np.where(above, mid, high)
+            low = np.where(above, low, mid)
+        vol[unsolved] = 0.5 * (low + high)
+
+    return np.where(valid, vol, np.nan)
+
+
+def black76_greeks(forward, strike, years, vol, is_call, rate=0.0):
+    """Delta, gamma, vega (per vol point) and theta (per day) of every row."""
+    sqrt_t = np.sqrt(years)
+    d1 = (np.log(forward / strike) + 0.5 * vol * vol * years) / (vol * sqrt_t)
+    discount = np.exp(-rate * years)
+    pdf = norm_pdf(d1)
+    call_delta = discount * norm_cdf(d1)
+    delta = np.where(is_call, call_delta, call_delta - discount)
+    gamma = discount * pdf / (forward * vol * sqrt_t)
+    vega = discount * forward * pdf * sqrt_t
+    price = black76_price(forward, strike, years, vol, is_call, rate)
+    theta = rate * price - discount * forward * pdf * vol / (2 * sqrt_t)
+    return {
+        "delta": delta,
+        "gamma": gamma,
+        "vega": vega / 100,
+        "theta": theta / 365,
+    }
+
+
+class GreeksEngine:
+    """Keeps IV and greeks of a whole chain, recomputing only rows whose inputs changed."""
+
+    def __init__(self, rate=0.0):
+        self.rate = rate
+        self.inputs = None
+        self.outputs = {field: np.empty(0) for field in OUTPUTS}
+        self.recomputed = 0
+
+    def _resize(self, size):
+        current = len(self.outputs["iv"])
+        if size <= current:
+            return
+        for field in OUTPUTS:
+            self.outputs[field] = np.concatenate(
+                [self.outputs[field], np.full(size - current, np.nan)]
+            )
+        if self.inputs is not None:
+            self.inputs = np.concatenate(
+                [self.inputs, np.full((size - current, self.inputs.shape[1]), np.nan)]
+            )
+
+    def update(self, price, strike, years, forward, is_call):
+        """Recompute changed rows, returns the boolean mask of recomputed rows."""
+        price, strike, years, forward, is_call = np.broadcast_arrays(
+            *(
+                np.asarray(a, dtype=float)
+                for a in (price, strike, years, forward, is_call)
+            )
+        )
+        inputs = np.column_stack([price, strike, years, forward, is_call])
+        self._resize(len(inputs))
+        if self.inputs is None:
+            self.inputs = np.full_like(inputs, np.nan)
+
+        previous = self.inputs[: len(inputs)]
+        changed = np.any(previous != inputs, axis=1) & np.all(
+            np.isfinite(inputs), axis=1
+        )
+        if not changed.any():
+            return changed
+
+        c = is_call[changed].astype(bool)
+        f, k, t = forward[changed], strike[changed], years[changed]
+        iv = implied_vol(price[changed], f, k, t, c, self.rate)
+        self.outputs["iv"][: len(inputs)][changed] = iv
+        for field, values in black76_greeks(f, k, t, iv, c, self.rate).items():
+            self.outputs[field][: len(inputs)][changed] = values
+
+        previous[changed] = inputs[changed]
+        self.recomputed += int(changed.sum())
+        return changed
+
+    def update_chain(self, store, forward, now=None, price_field="mark", time_step=60):
+        """Feed rows of an OptionChainStore, ``forward`` is a scalar or per-row array.
+
+        ``now`` is floored to ``time_step`` seconds so time decay alone does not
+        mark every row as changed on each call.
+        """
+        now = time.time() if now is None else now
+        now -= now % time_step
+        years = (store.column("expiry") - now) / YEAR_SECONDS
+        return self.update(
+            store.column(price_field),
+            store.column("strike"),
+            years,
+            forward,
+            store.column("is_call"),
+        )
+
+    def __getitem__(self, field):
+        return self.outputs[field]
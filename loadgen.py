@@ -0,0 +1,184 @@
+"""
+Load generator for the webhook routes of trade.py.
+
+    python loadgen.py --url http://localhost:5001/long --rate 200 --duration 30
+
+Requests are sent open loop at the target rate and their latency is counted
+from the scheduled send time, so a slow server shows up as latency instead
+of silently lowering the rate. Every request gets its own idempotency key
+unless --same-key is given.
+
+Routes answer 202 once the signal is queued, the request latency is only
+the intake. With trade.py pointed at mock_exchange.py, --exchange-url also
+reports the signal to order latency: the trace id of each response is joined
+to its order ids through /debug/latency, and those to the time the mock
+received the order.
+
+    python loadgen.py --rate 200 --exchange-url http://localhost:8080
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from urllib.parse import urlsplit
+
+import aiohttp
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, int(round(q / 100 * (len(values) - 1)))))
+    return values[index]
+
+
+async def order_latencies(session, url, exchange_url, sent, count):
+    """Seconds from each request's scheduled send to its first order reaching
+    the mock exchange, ``sent`` maps trace ids to wall clock send times."""
+    parts = urlsplit(url)
+    async with session.get(
+        f"{parts.scheme}://{parts.netloc}/debug/latency", params={"recent": count}
+    ) as response:
+        traces = (await response.json()).get("recent") or []
+    async with session.get(f"{exchange_url}/debug/received") as response:
+        received = await response.json()
+
+    latencies = []
+    for trace in traces:
+        scheduled = sent.get(trace["id"])
+        times = [received[o] for o in trace["order_ids"] if o in received]
+        if scheduled is not None and times:
+            latencies.append(min(times) - scheduled)
+    latencies.sort()
+    return latencies
+
+
+async def run(
+    url,
+    rate,
+    duration,
+    body,
+    same_key=False,
+    timeout=10.0,
+    concurrency=1000,
+    exchange_url=None,
+    settle=2.0,
+):
+    latencies = []
+    statuses = {}
+    errors = {}
+    sent = {}  # trace id -> wall clock time the request was scheduled
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+    wall_offset = time.time() - loop.time()
+
+    async def fire(session, scheduled):
+        payload = dict(body)
+        if not same_key:
+            payload["idempotency_key"] = uuid.uuid4().hex
+        async with semaphore:
+            try:
+                async with session.post(url, json=payload) as response:
+                    data = await response.read()
+                    statuses[response.status] = statuses.get(response.status, 0) + 1
+                if exchange_url:
+                    trace = json.loads(data).get("trace")
+                    if trace is not None:
+                        sent[trace] = scheduled + wall_offset
+            except Exception as e:
+                name = type(e).__name__
+                errors[name] = errors.get(name, 0) + 1
+                return
+        latencies.append(loop.time() - scheduled)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    async with aiohttp.ClientSession(
+        connector=connector, timeout=client_timeout
+    ) as session:
+        tasks = []
+        started = loop.time()
+        total = int(rate * duration)
+        for i in range(total):
+            scheduled = started + i / rate
+            delay = scheduled - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.ensure_future(fire(session, scheduled)))
+        await asyncio.gather(*tasks)
+        elapsed = loop.time() - started
+
+        orders = []
+        if exchange_url:
+            # Queued signals are still being executed
+            await asyncio.sleep(settle)
+            orders = await order_latencies(
+                session, url, exchange_url, sent, len(sent) * 2
+            )
+
+    latencies.sort()
+    report = {
+        "requests": total,
+        "completed": len(latencies),
+        "elapsed": elapsed,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "statuses": statuses,
+        "errors": errors,
+        "p50_ms": _ms(percentile(latencies, 50)),
+        "p99_ms": _ms(percentile(latencies, 99)),
+        "p999_ms": _ms(percentile(latencies, 99.9)),
+        "max_ms": _ms(latencies[-1] if latencies else None),
+    }
+    if exchange_url:
+        report.update(
+            {
+                "orders": len(orders),
+                "order_p50_ms": _ms(percentile(orders, 50)),
+                "order_p99_ms": _ms(percentile(orders, 99)),
+                "order_max_ms": _ms(orders[-1] if orders else None),
+            }
+        )
+    return report
+
+
+def _ms(seconds):
+    return None if seconds is None else seconds * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for trade.py")
+    parser.add_argument("--url", default="http://127.0.0.1:5001/long")
+    parser.add_argument("--rate", type=float, default=100.0, help="requests/s")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--body", default='{"quantity": 0.01}', help="JSON payload")
+    parser.add_argument("--same-key", action="store_true")
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=1000)
+    parser.add_argument(
+        "--exchange-url", help="mock_exchange.py trade.py sends orders to"
+    )
+    parser.add_argument(
+        "--settle", type=float, default=2.0, help="seconds to wait for orders"
+    )
+    args = parser.parse_args()
+
+    report = asyncio.run(
+        run(
+            args.url,
+            args.rate,
+            args.duration,
+            json.loads(args.body),
+            args.same_key,
+            args.timeout,
+            args.concurrency,
+            args.exchange_url,
+            args.settle,
+        )
+    )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
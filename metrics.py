@@ -0,0 +1,263 @@
+import bisect
+import math
+import threading
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds, from a fast signature up to a stalled read loop
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self.children[()] = self._child()
+
+    def labels(self, *values):
+        """Handle of one label combination, keep it to record without a lookup."""
+        child = self.children.get(values)
+        if child is None:
+            values = tuple(str(v) for v in values)
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self.children.setdefault(values, self._child())
+        return child
+
+    def _label_text(self, values, extra=()):
+        pairs = list(zip(self.labelnames, values)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+    def expose(self):
+        lines = [
+            f"# HELP {self.name} {_escape(self.help)}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        for values, child in sorted(self.children.items()):
+            lines.extend(self._samples(values, child))
+        return lines
+
+
+class LabelHandles(dict):
+    """Handles of ``metric`` keyed by the values of its last label, cached so a
+    hit is one dict lookup. ``prefix`` fills the labels before it.
+    """
+
+    def __init__(self, metric, *prefix):
+        super().__init__()
+        self.metric = metric
+        self.prefix = prefix
+
+    def __missing__(self, value):
+        handle = self[value] = self.metric.labels(*self.prefix, value)
+        return handle
+
+
+class CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class Counter(_Metric):
+    type = "counter"
+    _child = CounterChild
+
+    def inc(self, amount=1):
+        self.children[()].value += amount
+
+    def _samples(self, values, child):
+        return [f"{self.name}{self._label_text(values)} {_format(child.value)}"]
+
+
+class GaugeChild:
+    __slots__ = ("value", "function")
+
+    def __init__(self):
+        self.value = 0
+        self.function = None
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def set_function(self, function):
+        """Read the value from ``function`` at scrape time, e.g. a queue length."""
+        self.function = function
+
+    def get(self):
+        if self.function is None:
+            return self.value
+        try:
+            return float(self.function())
+        except Exception:
+            return math.nan
+
+
+class Gauge(_Metric):
+    type = "gauge"
+    _child = GaugeChild
+
+    def set(self, value):
+        self.children[()].value = value
+
+    def set_function(self, function):
+        self.children[()].function = function
+
+    def _samples(self, values, child):
+        return [f"{self.name}{self._label_text(values)} {_format(child.get())}"]
+
+
+class HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames)
+
+    def _child(self):
+        return HistogramChild(self.bounds)
+
+    def observe(self, value):
+        self.children[()].observe(value)
+
+    def _samples(self, values, child):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.bounds + (math.inf,), list(child.counts)):
+            cumulative += count
+            labels = self._label_text(values, [("le", _format(float(bound)))])
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = self._label_text(values)
+        lines.append(f"{self.name}_sum{labels} {_format(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class Registry:
+    """Named metrics of the process with a Prometheus text exposition.
+
+    Recording is a plain attribute update on a handle obtained up front, no
+    lock is taken, so a counter bumped from several threads at once may lose
+    an increment now and then. That is the price of keeping it off the order
+    path.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"{name} is already registered as a {metric.type}")
+            return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter, name, help, labelnames)
+
+    def gauge(self, name, help, labelnames=()):
+        return self._register(Gauge, name, help, labelnames)
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, help, labelnames, buckets)
+
+    def expose(self):
+        with self._lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Metrics recorded by AevoClient
+ORDERS_SENT = REGISTRY.counter(
+    "aevo_orders_sent_total", "Order commands sent", ("transport", "op")
+)
+ORDER_ACKS = REGISTRY.counter(
+    "aevo_order_acks_total",
+    "Order commands acknowledged by the exchange, op unknown for untracked ones",
+    ("op",),
+)
+ORDER_REJECTS = REGISTRY.counter(
+    "aevo_order_rejects_total",
+    "Orders rejected by the exchange or by pre-trade risk",
+    ("source", "error"),
+)
+WS_RECONNECTS = REGISTRY.counter("aevo_ws_reconnects_total", "Websocket reconnects")
+WS_MESSAGES = REGISTRY.counter(
+    "aevo_ws_messages_total", "Websocket messages received", ("channel",)
+)
+WS_LAST_MESSAGE = REGISTRY.gauge(
+    "aevo_ws_last_message_timestamp_seconds", "Unix time of the last message"
+)
+READ_LAG = REGISTRY.histogram(
+    "aevo_ws_read_lag_seconds",
+    "Time a read_messages consumer spends on a message before reading the next",
+)
+SIGN_SECONDS = REGISTRY.histogram("aevo_sign_seconds", "Time to sign an order")
@@ -0,0 +1,511 @@
+"""
+Local stand-in for the Aevo REST and websocket API.
+
+    python mock_exchange.py --port 8080 --latency 0.005 --error-rate 0.01
+
+and point AevoClient at it with ``rest_url="http://localhost:8080"`` and
+``ws_url="ws://localhost:8080/ws"`` (``keys.rest_url`` / ``keys.ws_url`` for
+trade.py). Orders must carry a valid EIP-712 signature of the env's signing
+domain, market orders and crossing limit orders fill at the mark price.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from email.utils import formatdate
+
+from aiohttp import WSMsgType, web
+from eth_account import Account
+from eth_hash.auto import keccak
+from loguru import logger
+
+from aevo import CONFIG, Order
+from eip712_structs import make_domain
+from quantizer import MAX_UINT256
+
+DECIMALS = 10**6
+
+DEFAULT_MARKETS = [
+    {
+        "instrument_id": "1",
+        "instrument_name": "ETH-PERP",
+        "instrument_type": "PERPETUAL",
+        "underlying_asset": "ETH",
+        "quote_asset": "USDC",
+        "price_step": "0.01",
+        "amount_step": "0.01",
+        "mark_price": "3000",
+        "index_price": "3000",
+        "is_active": True,
+    },
+    {
+        "instrument_id": "2",
+        "instrument_name": "BTC-PERP",
+        "instrument_type": "PERPETUAL",
+        "underlying_asset": "BTC",
+        "quote_asset": "USDC",
+        "price_step": "0.5",
+        "amount_step": "0.001",
+        "mark_price": "60000",
+        "index_price": "60000",
+        "is_active": True,
+    },
+]
+
+
+class MockExchange:
+    """In-memory exchange state behind the REST and websocket handlers.
+
+    ``latency`` (+ uniform ``jitter``) seconds are added to every request and
+    command, ``error_rate`` of them fail with ``INTERNAL_ERROR``. The first
+    signer seen for a maker is bound to it, later orders signed by another
+    key are rejected like the exchange does for unregistered signing keys.
+    The exchange clock runs ``clock_skew`` seconds ahead of the local one and
+    orders stamped more than ``max_timestamp_drift`` away from it are rejected.
+    """
+
+    def __init__(
+        self,
+        env="testnet",
+        markets=None,
+        balance=100000.0,
+        margin_rate=0.1,
+        latency=0.0,
+        jitter=0.0,
+        error_rate=0.0,
+        verify_signatures=True,
+        clock_skew=0.0,
+        max_timestamp_drift=5.0,
+    ):
+        self.domain = make_domain(**CONFIG[env]["signing_domain"])
+        self.markets = {m["instrument_id"]: dict(m) for m in markets or DEFAULT_MARKETS}
+        self.balance = balance
+        self.margin_rate = margin_rate
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.verify_signatures = verify_signatures
+        self.clock_skew = clock_skew
+        self.max_timestamp_drift = max_timestamp_drift
+        self.signers = {}  # maker -> signing key address
+        self.orders = {}
+        self.received = {}  # order_id -> local time.time() it first reached us
+        self.positions = {}  # instrument_id -> [signed amount, avg entry price]
+        self.realized_pnl = 0.0
+        self.sockets = {}  # websocket -> subscribed channels
+        self.counts = {"requests": 0, "orders": 0, "fills": 0, "errors": 0}
+        self._trade_ids = itertools.count(1)
+
+    def now(self):
+        return time.time() + self.clock_skew
+
+    def now_ns(self):
+        return int(self.now() * 1e9)
+
+    async def delay(self):
+        self.counts["requests"] += 1
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+        if self.error_rate and random.random() < self.error_rate:
+            self.counts["errors"] += 1
+            return {"error": "INTERNAL_ERROR"}
+        return None
+
+    def mark(self, instrument_id):
+        return float(self.markets[str(instrument_id)]["mark_price"])
+
+    def set_mark(self, instrument_id, price):
+        self.markets[str(instrument_id)]["mark_price"] = str(price)
+
+    def used_margin(self):
+        return sum(
+            abs(amount) * self.mark(instrument_id) * self.margin_rate
+            for instrument_id, (amount, _) in self.positions.items()
+        )
+
+    def available_margin(self):
+        return self.balance + self.realized_pnl - self.used_margin()
+
+    def verify(self, data):
+        struct = Order(
+            maker=data["maker"],
+            isBuy=data["is_buy"],
+            limitPrice=int(data["limit_price"]),
+            amount=int(data["amount"]),
+            salt=int(data["salt"]),
+            instrument=int(data["instrument"]),
+            timestamp=int(data["timestamp"]),
+        )
+        signable = keccak(struct.signable_bytes(domain=self.domain))
+        order_id = f"0x{signable.hex()}"
+        if not self.verify_signatures:
+            return order_id, None
+
+        try:
+            signer = Account._recover_hash(signable, signature=data["signature"])
+        except Exception:
+            return order_id, "INVALID_SIGNATURE"
+        if self.signers.setdefault(data["maker"].lower(), signer) != signer:
+            return order_id, "SIGNING_KEY_NOT_REGISTERED"
+        return order_id, None
+
+    def order_view(self, order):
+        return {
+            key: order[key]
+            for key in (
+                "order_id",
+                "instrument_id",
+                "instrument_name",
+                "side",
+                "amount",
+                "price",
+                "filled",
+                "order_status",
+                "post_only",
+                "timestamp",
+            )
+        }
+
+    def create_order(self, data, replaces=None):
+        try:
+            instrument_id = str(data["instrument"])
+            market = self.markets.get(instrument_id)
+            if market is None:
+                return {"error": "INVALID_INSTRUMENT"}
+            order_id, error = self.verify(data)
+        except (KeyError, ValueError, TypeError):
+            return {"error": "INVALID_ORDER"}
+        if error:
+            return {"error": error}
+        self.received.setdefault(order_id, time.time())
+        if abs(int(data["timestamp"]) - self.now()) > self.max_timestamp_drift:
+            return {"error": "INVALID_TIMESTAMP"}
+        if order_id in self.orders:
+            # Same signed order replayed, answer like the first time
+            return self.order_view(self.orders[order_id])
+
+        is_buy = bool(data["is_buy"])
+        amount = int(data["amount"]) / DECIMALS
+        scaled_price = int(data["limit_price"])
+        mark = self.mark(instrument_id)
+        if scaled_price in (0, MAX_UINT256):
+            price = mark
+        else:
+            price = scaled_price / DECIMALS
+        if amount <= 0:
+            return {"error": "INVALID_AMOUNT"}
+
+        crosses = price >= mark if is_buy else price <= mark
+        if crosses and data.get("post_only"):
+            return {"error": "POST_ONLY_WOULD_CROSS"}
+        if not self.reduces(instrument_id, is_buy, amount):
+            if amount * mark * self.margin_rate > self.available_margin():
+                return {"error": "INSUFFICIENT_AVAILABLE_MARGIN"}
+
+        if replaces is not None:
+            previous = self.orders.get(replaces)
+            if previous is None or previous["order_status"] not in (
+                "opened",
+                "partial",
+            ):
+                return {"error": "ORDER_DOES_NOT_EXIST"}
+            previous["order_status"] = "cancelled"
+            self.publish("orders", {"orders": [self.order_view(previous)]})
+
+        order = {
+            "order_id": order_id,
+            "instrument_id": instrument_id,
+            "instrument_name": market["instrument_name"],
+            "side": "buy" if is_buy else "sell",
+            "amount": str(amount),
+            "price": str(price),
+            "filled": "0",
+            "order_status": "opened",
+            "post_only": bool(data.get("post_only")),
+            "timestamp": str(self.now_ns()),
+        }
+        self.orders[order_id] = order
+        self.counts["orders"] += 1
+        if crosses:
+            self.fill(order, mark)
+        self.publish("orders", {"orders": [self.order_view(order)]})
+        return self.order_view(order)
+
+    def reduces(self, instrument_id, is_buy, amount):
+        position, _ = self.positions.get(instrument_id, (0.0, 0.0))
+        return position and (position < 0) == is_buy and amount <= abs(position)
+
+    def fill(self, order, price):
+        amount = float(order["amount"]) - float(order["filled"])
+        is_buy = order["side"] == "buy"
+        position, entry = self.positions.get(order["instrument_id"], (0.0, 0.0))
+        signed = amount if is_buy else -amount
+        if position == 0 or (position > 0) == is_buy:
+            entry = (abs(position) * entry + amount * price) / (abs(position) + amount)
+        else:
+            closed = min(amount, abs(position))
+            self.realized_pnl += closed * (price - entry) * (1 if position > 0 else -1)
+            if abs(signed) > abs(position):
+                entry = price
+        position += signed
+        if abs(position) < 1e-12:
+            self.positions.pop(order["instrument_id"], None)
+        else:
+            self.positions[order["instrument_id"]] = (position, entry)
+
+        order["filled"] = order["amount"]
+        order["order_status"] = "filled"
+        self.counts["fills"] += 1
+        self.publish(
+            "fills",
+            {
+                "fill": {
+                    "trade_id": str(next(self._trade_ids)),
+                    "order_id": order["order_id"],
+                    "instrument_id": order["instrument_id"],
+                    "instrument_name": order["instrument_name"],
+                    "side": order["side"],
+                    "price": str(price),
+                    "filled": str(amount),
+                    "order_status": "filled",
+                    "created_timestamp": str(self.now_ns()),
+                }
+            },
+        )
+
+    def cancel_order(self, order_id):
+        order = self.orders.get(order_id)
+        if order is None or order["order_status"] not in ("opened", "partial"):
+            return {"error": "ORDER_DOES_NOT_EXIST"}
+        order["order_status"] = "cancelled"
+        self.publish("orders", {"orders": [self.order_view(order)]})
+        return {"order_id": order_id}
+
+    def cancel_all_orders(self, asset=None):
+        cancelled = []
+        for order in self.open_orders():
+            if asset and not order["instrument_name"].startswith(f"{asset}-"):
+                continue
+            self.cancel_order(order["order_id"])
+            cancelled.append(order["order_id"])
+        return {"success": True, "order_ids": cancelled}
+
+    def open_orders(self):
+        return [
+            self.order_view(order)
+            for order in self.orders.values()
+            if order["order_status"] in ("opened", "partial")
+        ]
+
+    def positions_view(self):
+        positions = []
+        for instrument_id, (amount, entry) in self.positions.items():
+            market = self.markets[instrument_id]
+            mark = self.mark(instrument_id)
+            positions.append(
+                {
+                    "instrument_id": instrument_id,
+                    "instrument_name": market["instrument_name"],
+                    "instrument_type": market["instrument_type"],
+                    "asset": market["underlying_asset"],
+                    "side": "buy" if amount > 0 else "sell",
+                    "amount": str(abs(amount)),
+                    "avg_entry_price": str(entry),
+                    "mark_price": str(mark),
+                    "unrealized_pnl": str(amount * (mark - entry)),
+                }
+            )
+        return positions
+
+    def portfolio(self):
+        balance = self.balance + self.realized_pnl
+        return {
+            "balance": str(balance),
+            "realized_pnl": str(self.realized_pnl),
+            "user_margin": {"balance": str(balance), "used": str(self.used_margin())},
+        }
+
+    def account(self):
+        balance = self.balance + self.realized_pnl
+        return {
+            "balance": str(balance),
+            "equity": str(
+                balance + sum(float(p["unrealized_pnl"]) for p in self.positions_view())
+            ),
+            "available_balance": str(self.available_margin()),
+        }
+
+    def publish(self, channel, data):
+        frame = json.dumps({"channel": channel, "data": data})
+        for socket, channels in list(self.sockets.items()):
+            if channel in channels and not socket.closed:
+                asyncio.ensure_future(socket.send_str(frame))
+
+    # REST handlers
+
+    async def _respond(self, handler):
+        error = await self.delay()
+        if error:
+            return web.json_response(error, status=500)
+        result = handler()
+        status = 400 if isinstance(result, dict) and result.get("error") else 200
+        headers = {"Date": formatdate(self.now(), usegmt=True)}
+        return web.json_response(result, status=status, headers=headers)
+
+    async def get_markets(self, request):
+        asset = request.query.get("asset")
+        return await self._respond(
+            lambda: [
+                m
+                for m in self.markets.values()
+                if not asset or m["underlying_asset"] == asset
+            ]
+        )
+
+    async def get_index(self, request):
+        asset = request.query.get("asset")
+        for market in self.markets.values():
+            if market["underlying_asset"] == asset:
+                price = market["index_price"]
+                break
+        else:
+            return web.json_response({"error": "INVALID_ASSET"}, status=400)
+        return await self._respond(
+            lambda: {"price": price, "timestamp": str(self.now_ns())}
+        )
+
+    async def post_order(self, request):
+        data = await request.json()
+        return await self._respond(lambda: self.create_order(data))
+
+    async def get_orders(self, request):
+        return await self._respond(self.open_orders)
+
+    async def get_order(self, request):
+        order = self.orders.get(request.match_info["order_id"])
+        if order is None:
+            return web.json_response({"error": "ORDER_DOES_NOT_EXIST"}, status=404)
+        return await self._respond(lambda: self.order_view(order))
+
+    async def delete_order(self, request):
+        order_id = request.match_info["order_id"]
+        return await self._respond(lambda: self.cancel_order(order_id))
+
+    async def delete_orders_all(self, request):
+        body = await request.json() if request.can_read_body else {}
+        return await self._respond(lambda: self.cancel_all_orders(body.get("asset")))
+
+    async def get_received(self, request):
+        # Not part of the Aevo API, loadgen.py joins it with trade.py's traces
+        return web.json_response(self.received)
+
+    async def get_positions(self, request):
+        return await self._respond(lambda: {"positions": self.positions_view()})
+
+    async def get_portfolio(self, request):
+        return await self._respond(self.portfolio)
+
+    async def get_account(self, request):
+        return await self._respond(self.account)
+
+    # Websocket
+
+    async def websocket(self, request):
+        socket = web.WebSocketResponse()
+        await socket.prepare(request)
+        self.sockets[socket] = set()
+        try:
+            async for message in socket:
+                if message.type != WSMsgType.TEXT:
+                    continue
+                response = await self.command(socket, json.loads(message.data))
+                if response is not None:
+                    await socket.send_str(json.dumps(response))
+        finally:
+            self.sockets.pop(socket, None)
+        return socket
+
+    async def command(self, socket, message):
+        op = message.get("op")
+        data = message.get("data")
+        response = {"id": message.get("id")} if "id" in message else {}
+
+        if op in ("subscribe", "unsubscribe"):
+            channels = self.sockets[socket]
+            if op == "subscribe":
+                channels.update(data)
+            else:
+                channels.difference_update(data)
+            response["data"] = sorted(channels)
+            return response
+        if op == "auth":
+            response["data"] = {"success": True}
+            return response
+
+        error = await self.delay()
+        if error:
+            return dict(response, **error)
+        if op == "create_order":
+            result = self.create_order(data)
+        elif op == "edit_order":
+            result = self.create_order(data, replaces=data.get("order_id"))
+        elif op == "cancel_order":
+            result = self.cancel_order(data.get("order_id"))
+        elif op == "cancel_all_orders":
+            result = self.cancel_all_orders((data or {}).get("asset"))
+        else:
+            result = {"error": "INVALID_OP"}
+
+        if result.get("error"):
+            return dict(response, error=result["error"])
+        response["data"] = result
+        return response
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get("/markets", self.get_markets)
+        app.router.add_get("/index", self.get_index)
+        app.router.add_post("/orders", self.post_order)
+        app.router.add_get("/orders", self.get_orders)
+        app.router.add_get("/orders/{order_id}", self.get_order)
+        app.router.add_delete("/orders/{order_id}", self.delete_order)
+        app.router.add_delete("/orders-all", self.delete_orders_all)
+        app.router.add_get("/positions", self.get_positions)
+        app.router.add_get("/portfolio", self.get_portfolio)
+        app.router.add_get("/account", self.get_account)
+        app.router.add_get("/ws", self.websocket)
+        app.router.add_get("/debug/received", self.get_received)
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local mock of the Aevo API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--env", default="testnet")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--balance", type=float, default=100000.0)
+    parser.add_argument("--no-verify", action="store_true")
+    parser.add_argument("--clock-skew", type=float, default=0.0, help="seconds")
+    args = parser.parse_args()
+
+    exchange = MockExchange(
+        env=args.env,
+        balance=args.balance,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        verify_signatures=not args.no_verify,
+        clock_skew=args.clock_skew,
+    )
+    logger.info(f"Mock Aevo exchange on http://{args.host}:{args.port}")
+    web.run_app(exchange.app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
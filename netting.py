@@ -0,0 +1,96 @@
+import asyncio
+
+from loguru import logger
+
+import tracing
+
+# Net quantities below this are float noise of offsetting signals
+EPSILON = 1e-9
+
+
+class SignalNetter:
+    """Nets market signals of an instrument arriving within ``window`` seconds.
+
+    The first signal of an instrument opens a window, signals submitted until
+    it closes are summed and ``execute(instrument_id, is_buy, quantity)`` is
+    awaited once for the net quantity, or not at all when they cancel out.
+    Each caller gets its own outcome: the part of its quantity that went into
+    the net order (pro rata on the net side) and the part crossed internally
+    against opposing signals. The net order is traced on the trace of every
+    signal of the window.
+    """
+
+    def __init__(self, execute, window=0.005):
+        self.execute = execute
+        self.window = window
+        self.batches = {}
+        self.stats = {"signals": 0, "orders": 0, "netted_out": 0}
+
+    async def submit(self, instrument_id, is_buy, quantity):
+        loop = asyncio.get_running_loop()
+        batch = self.batches.get(instrument_id)
+        if batch is None:
+            batch = self.batches[instrument_id] = []
+            loop.call_later(
+                self.window, lambda: asyncio.ensure_future(self._flush(instrument_id))
+            )
+
+        future = loop.create_future()
+        batch.append((is_buy, float(quantity), future, tracing.current_trace.get()))
+        self.stats["signals"] += 1
+        return await future
+
+    async def _flush(self, instrument_id):
+        batch = self.batches.pop(instrument_id)
+        # The flush runs in the context of the first signal, the order is all's
+        tracing.current_trace.set(tracing.group(trace for *_, trace in batch))
+        net = sum(quantity if is_buy else -quantity for is_buy, quantity, *_ in batch)
+        order_is_buy = net > 0
+        order_quantity = abs(net) if abs(net) > EPSILON else 0.0
+
+        response = None
+        if order_quantity:
+            self.stats["orders"] += 1
+            try:
+                response = await self.execute(
+                    instrument_id, order_is_buy, order_quantity
+                )
+            except Exception as e:
+                logger.error(
+                    f"Error thrown when executing net order of {instrument_id}"
+                )
+                logger.error(e)
+                for _, _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+        else:
+            self.stats["netted_out"] += 1
+            logger.info(f"{len(batch)} signals of {instrument_id} netted out")
+
+        order = None
+        if order_quantity:
+            order = {
+                "side": "buy" if order_is_buy else "sell",
+                "quantity": order_quantity,
+            }
+        side_total = sum(
+            quantity for is_buy, quantity, *_ in batch if is_buy == order_is_buy
+        )
+        for is_buy, quantity, future, _ in batch:
+            executed = 0.0
+            if order_quantity and is_buy == order_is_buy:
+                executed = quantity * order_quantity / side_total
+            if not future.done():
+                future.set_result(
+                    {
+                        "instrument_id": instrument_id,
+                        "side": "buy" if is_buy else "sell",
+                        "quantity": quantity,
+                        "executed_quantity": executed,
+                        "netted_quantity": quantity - executed,
+                        "signals": len(batch),
+                        "order": order,
+                        "response": response,
+                    }
+                )
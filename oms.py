@@ -0,0 +1,272 @@
+import asyncio
+import json
+import time
+from collections import deque
+
+from loguru import logger
+
+PENDING = "pending"
+OPEN = "open"
+PARTIALLY_FILLED = "partially_filled"
+FILLED = "filled"
+CANCELLED = "cancelled"
+REJECTED = "rejected"
+# Gone from the open orders while we were not listening: filled or cancelled,
+# settled by a late fill or a REST lookup of the order
+UNKNOWN = "unknown"
+
+LIVE = (PENDING, OPEN, PARTIALLY_FILLED)
+
+# Aevo order_status -> local state
+EXCHANGE_STATUS = {
+    "opened": OPEN,
+    "partial": PARTIALLY_FILLED,
+    "filled": FILLED,
+    "cancelled": CANCELLED,
+    "expired": CANCELLED,
+    "rejected": REJECTED,
+}
+
+
+class LocalOrder:
+    def __init__(self, order_id, instrument_id, is_buy, price, amount, state=PENDING):
+        self.order_id = order_id
+        self.instrument_id = str(instrument_id)
+        self.instrument_name = None
+        self.is_buy = is_buy
+        self.price = price
+        self.amount = amount
+        self.filled = 0.0
+        self.state = state
+        self.error = None
+        self.replaces = None
+        self.updated_at = time.time()
+
+    @property
+    def remaining(self):
+        return self.amount - self.filled
+
+    def as_dict(self):
+        return {
+            "order_id": self.order_id,
+            "instrument_id": self.instrument_id,
+            "instrument_name": self.instrument_name,
+            "side": "buy" if self.is_buy else "sell",
+            "price": self.price,
+            "amount": self.amount,
+            "filled": self.filled,
+            "state": self.state,
+            "error": self.error,
+        }
+
+
+class OrderManager:
+    """In-memory view of our orders driven by the ``orders`` and ``fills`` channels.
+
+    Orders move through pending -> open -> partially filled -> filled, cancelled
+    or rejected and are indexed by order id and by instrument, so open-order
+    queries are local reads. ``reconcile`` aligns the view with one REST
+    snapshot, on start and after every reconnect of the attached client.
+    Live orders missing from the snapshot become ``unknown`` until a fill or
+    a lookup of the order tells how they ended. Without the outbound queue
+    there is no ack to wait for, a pending order left out of the stream is
+    only resolved by a reconcile, once it is older than ``pending_timeout``.
+    """
+
+    def __init__(self, client=None, keep_closed=1000, pending_timeout=30.0):
+        self.client = client
+        self.keep_closed = keep_closed
+        self.pending_timeout = pending_timeout
+        self.orders = {}
+        self.by_instrument = {}
+        self.closed = deque(maxlen=keep_closed)
+        if client is not None:
+            client.oms = self
+
+    def _index(self, order):
+        live = self.by_instrument.setdefault(order.instrument_id, {})
+        if order.state in LIVE:
+            live[order.order_id] = order
+            return
+
+        if live.pop(order.order_id, None) is None:
+            # Settled from unknown, already counted as closed
+            return
+        if self.closed and len(self.closed) == self.closed.maxlen:
+            self.orders.pop(self.closed[0], None)
+        self.closed.append(order.order_id)
+
+    def _transition(self, order, state):
+        if order.state == state:
+            return
+        if order.state == UNKNOWN:
+            # No longer open on the exchange, only its final state is news
+            if state in LIVE:
+                return
+        elif order.state not in LIVE:
+            # Terminal states are final, late stream updates do not reopen them
+            return
+        order.state = state
+        order.updated_at = time.time()
+        self._index(order)
+
+    def get(self, order_id):
+        return self.orders.get(order_id)
+
+    def open_orders(self, instrument_id=None):
+        if instrument_id is not None:
+            return list(self.by_instrument.get(str(instrument_id), {}).values())
+        return [
+            order for orders in self.by_instrument.values() for order in orders.values()
+        ]
+
+    def on_sent(self, order_id, instrument_id, is_buy, price, amount, replaces=None):
+        order = self.orders.get(order_id)
+        if order is None:
+            order = LocalOrder(order_id, instrument_id, is_buy, price, amount)
+            order.replaces = replaces
+            self.orders[order_id] = order
+            self._index(order)
+        return order
+
+    def watch_ack(self, order_id, ack):
+        ack.add_done_callback(
+            lambda f: f.cancelled() or self.on_ack(order_id, f.result())
+        )
+
+    def on_ack(self, order_id, response):
+        order = self.orders.get(order_id)
+        if order is None or not isinstance(response, dict):
+            return
+
+        if response.get("error"):
+            order.error = response["error"]
+            self._transition(order, REJECTED)
+            return
+
+        # REST responses and websocket acks carry the order itself
+        data = response.get("data", response)
+        if isinstance(data, dict) and data.get("order_status"):
+            self.apply_order(dict(data, order_id=order_id))
+        elif order.state == PENDING:
+            self._transition(order, OPEN)
+
+    def handle(self, message):
+        if isinstance(message, (str, bytes)):
+            message = json.loads(message)
+
+        channel = message.get("channel")
+        data = message.get("data") or {}
+        if channel == "orders":
+            for order in data.get("orders") or ():
+                self.apply_order(order)
+        elif channel == "fills":
+            fill = data.get("fill")
+            if fill:
+                self.apply_fill(fill)
+
+    def apply_order(self, update):
+        order_id = update["order_id"]
+        order = self.orders.get(order_id)
+        if order is None:
+            order = self.orders[order_id] = LocalOrder(
+                order_id,
+                update.get("instrument_id"),
+                update.get("side") == "buy",
+                float(update.get("price") or 0),
+                float(update.get("amount") or 0),
+            )
+            self._index(order)
+
+        order.instrument_name = update.get("instrument_name", order.instrument_name)
+        if update.get("amount"):
+            order.amount = float(update["amount"])
+        if update.get("price"):
+            order.price = float(update["price"])
+        if update.get("filled"):
+            order.filled = float(update["filled"])
+
+        state = EXCHANGE_STATUS.get(update.get("order_status"), OPEN)
+        self._transition(order, state)
+        return order
+
+    def apply_fill(self, fill):
+        order = self.orders.get(fill.get("order_id"))
+        if order is None:
+            return None
+
+        order.filled = min(order.amount, order.filled + float(fill.get("filled") or 0))
+        state = EXCHANGE_STATUS.get(fill.get("order_status"))
+        if state is None:
+            state = FILLED if order.remaining <= 0 else PARTIALLY_FILLED
+        self._transition(order, state)
+        return order
+
+    def reconcile(self, snapshot=None):
+        """Align live orders with a REST snapshot of the open orders."""
+        fetched = snapshot is None
+        if fetched:
+            snapshot = self.client.rest_get_open_orders()
+        if not isinstance(snapshot, list):
+            logger.error(f"Cannot reconcile orders against {snapshot}")
+            return False
+
+        seen = set()
+        for update in snapshot:
+            update = dict(update)
+            update.setdefault("order_status", "opened")
+            order = self.orders.get(update.get("order_id"))
+            if order is not None and order.state == UNKNOWN:
+                # Missed by an earlier snapshot, the exchange says it is open
+                order.state = PENDING
+                try:
+                    self.closed.remove(order.order_id)
+                except ValueError:
+                    pass
+            seen.add(self.apply_order(update).order_id)
+
+        expired = time.time() - self.pending_timeout
+        for order in self.open_orders():
+            # Recently sent orders may not be in the snapshot yet
+            if order.order_id in seen:
+                continue
+            if order.state != PENDING or order.updated_at < expired:
+                # It may as well have filled while we were disconnected
+                self._transition(order, UNKNOWN)
+
+        if fetched:
+            for order in self.unknown_orders():
+                self.settle(order.order_id, self.client.rest_get_order(order.order_id))
+        return True
+
+    def unknown_orders(self):
+        return [order for order in self.orders.values() if order.state == UNKNOWN]
+
+    def settle(self, order_id, response):
+        """Applies a REST lookup of an order left unknown by ``reconcile``."""
+        order = self.orders.get(order_id)
+        if order is None or order.state != UNKNOWN or not isinstance(response, dict):
+            return order
+        if response.get("order_status"):
+            self.apply_order(dict(response, order_id=order_id))
+        else:
+            logger.warning(f"Cannot settle order {order_id} from {response}")
+        return order
+
+    async def reconcile_async(self):
+        loop = asyncio.get_running_loop()
+        snapshot = await loop.run_in_executor(None, self.client.rest_get_open_orders)
+        if not self.reconcile(snapshot):
+            return False
+
+        for order in self.unknown_orders():
+            response = await loop.run_in_executor(
+                None, self.client.rest_get_order, order.order_id
+            )
+            self.settle(order.order_id, response)
+        return True
+
+    async def start(self):
+        await self.client.subscribe_orders()
+        await self.client.subscribe_fills()
+        await self.reconcile_async()
@@ -0,0 +1,215 @@
+import asyncio
+import json
+import time
+import zlib
+from itertools import islice
+
+from loguru import logger
+from sortedcontainers import SortedDict
+
+# Levels per side covered by the checksum of an orderbook message
+CHECKSUM_DEPTH = 25
+
+
+class OrderBook:
+    """Local L2 book of one instrument built from ``orderbook:`` snapshots and updates.
+
+    Levels live in sorted dicts (bids keyed by negated price), so an update is
+    O(log n) and the top of book is the first item of each side.
+
+    A dropped update is caught by the message's ``checksum`` (CRC32 of the top
+    levels, bid and ask interleaved as ``price:amount``) or by a gap in its
+    ``sequence``. If a fresh snapshot already fails the checksum, the format
+    is not the one computed here and checksums are ignored for the book.
+    """
+
+    def __init__(self, instrument_name, verify_checksum=True):
+        self.instrument_name = instrument_name
+        self.bids = SortedDict()
+        self.asks = SortedDict()
+        self.raw = {}  # level key -> (price, amount) strings as sent, for the checksum
+        self.last_updated = 0
+        self.sequence = None
+        self.synced = False
+        self.verify_checksum = verify_checksum
+
+    def apply(self, data):
+        """Apply a snapshot or update, returns False when the book lost sync."""
+        last_updated = int(data.get("last_updated") or 0)
+        sequence = data.get("sequence", data.get("seq"))
+        snapshot = data.get("type") == "snapshot"
+
+        if snapshot:
+            self.bids.clear()
+            self.asks.clear()
+            self.raw.clear()
+            self.synced = True
+        elif (
+            not self.synced
+            or last_updated < self.last_updated
+            or (
+                sequence is not None
+                and self.sequence is not None
+                and int(sequence) != self.sequence + 1
+            )
+        ):
+            # Update before a snapshot, out of order or after a gap
+            self.synced = False
+            return False
+
+        for price, amount, *_ in data.get("bids") or ():
+            self._set_level(self.bids, -float(price), price, amount)
+        for price, amount, *_ in data.get("asks") or ():
+            self._set_level(self.asks, float(price), price, amount)
+        self.last_updated = last_updated
+        self.sequence = int(sequence) if sequence is not None else None
+
+        if (
+            self.bids
+            and self.asks
+            and -self.bids.peekitem(0)[0] >= self.asks.peekitem(0)[0]
+        ):
+            self.synced = False
+            return False
+
+        expected = data.get("checksum")
+        if self.verify_checksum and expected not in (None, ""):
+            if self.checksum() != int(expected) & 0xFFFFFFFF:
+                if snapshot:
+                    logger.warning(
+                        f"Order book {self.instrument_name} snapshot fails its "
+                        "checksum, checksums are not verified for it"
+                    )
+                    self.verify_checksum = False
+                else:
+                    self.synced = False
+                    return False
+        return True
+
+    def _set_level(self, side, key, price, amount):
+        if float(amount):
+            side[key] = float(amount)
+            self.raw[key] = (str(price), str(amount))
+        else:
+            side.pop(key, None)
+            self.raw.pop(key, None)
+
+    def checksum(self, depth=CHECKSUM_DEPTH):
+        bids = list(islice(self.bids.keys(), depth))
+        asks = list(islice(self.asks.keys(), depth))
+        parts = []
+        for i in range(max(len(bids), len(asks))):
+            for keys in (bids, asks):
+                if i < len(keys):
+                    parts.extend(self.raw[keys[i]])
+        return zlib.crc32(":".join(parts).encode())
+
+    def best_bid(self):
+        if not self.bids:
+            return None
+        price, amount = self.bids.peekitem(0)
+        return -price, amount
+
+    def best_ask(self):
+        if not self.asks:
+            return None
+        return self.asks.peekitem(0)
+
+    def mid(self):
+        bid, ask = self.best_bid(), self.best_ask()
+        if bid is None or ask is None:
+            return None
+        return (bid[0] + ask[0]) / 2
+
+    def microprice(self):
+        bid, ask = self.best_bid(), self.best_ask()
+        if bid is None or ask is None:
+            return None
+        return (bid[0] * ask[1] + ask[0] * bid[1]) / (bid[1] + ask[1])
+
+    def depth(self, k=10):
+        bids = [(-price, amount) for price, amount in islice(self.bids.items(), k)]
+        asks = list(islice(self.asks.items(), k))
+        return bids, asks
+
+    def cost_to_fill(self, is_buy, size):
+        """Walk the opposite side for ``size``, returns (cost, average price, filled)."""
+        levels = self.asks.items() if is_buy else self.bids.items()
+        remaining = size
+        cost = 0.0
+        for price, amount in levels:
+            price = abs(price)
+            take = min(amount, remaining)
+            cost += take * price
+            remaining -= take
+            if remaining <= 0:
+                break
+
+        filled = size - max(remaining, 0)
+        return cost, (cost / filled if filled else None), filled
+
+
+class OrderBooks:
+    """Keeps an OrderBook per ``orderbook:`` channel and resnapshots books that lost sync.
+
+    A book is resubscribed once per lost sync, until its snapshot arrives or
+    ``resync_timeout`` seconds pass without one.
+    """
+
+    def __init__(self, client=None, resync_timeout=10.0):
+        self.client = client
+        self.books = {}
+        self.resyncs = 0
+        self.resync_timeout = resync_timeout
+        self._resyncing = {}  # instrument_name -> monotonic time of the resubscribe
+
+    def get(self, instrument_name):
+        return self.books.get(instrument_name)
+
+    def handle(self, message):
+        if isinstance(message, (str, bytes)):
+            message = json.loads(message)
+
+        channel = message.get("channel") or ""
+        if not channel.startswith("orderbook:"):
+            return None
+
+        instrument_name = channel[len("orderbook:") :]
+        book = self.books.get(instrument_name)
+        if book is None:
+            book = self.books[instrument_name] = OrderBook(instrument_name)
+
+        data = message.get("data") or {}
+        was_synced = book.synced
+        if not book.apply(data):
+            # Updates keep failing until the new snapshot, warn only once
+            if was_synced:
+                logger.warning(
+                    f"Order book {instrument_name} lost sync, resnapshotting"
+                )
+            self.resnapshot(instrument_name)
+            return None
+        if data.get("type") == "snapshot":
+            self._resyncing.pop(instrument_name, None)
+        return book
+
+    def resnapshot(self, instrument_name):
+        if self.client is None:
+            return
+        started = self._resyncing.get(instrument_name)
+        if started is not None and time.monotonic() - started < self.resync_timeout:
+            return
+
+        self._resyncing[instrument_name] = time.monotonic()
+        self.resyncs += 1
+        asyncio.get_running_loop().create_task(self._resubscribe(instrument_name))
+
+    async def _resubscribe(self, instrument_name):
+        # A fresh subscription starts with a snapshot, handle() clears the
+        # resync when it is applied
+        try:
+            await self.client.unsubscribe([f"orderbook:{instrument_name}"])
+            await self.client.subscribe_orderbook(instrument_name)
+        except Exception:
+            self._resyncing.pop(instrument_name, None)
+            raise
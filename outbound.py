@@ -0,0 +1,208 @@
+import asyncio
+import itertools
+import json
+import time
+import traceback
+from collections import OrderedDict, deque
+
+from loguru import logger
+
+import tracing
+
+# Commands whose effect can be checked against the open orders snapshot
+ORDER_OPS = ("create_order", "edit_order")
+CANCEL_OPS = ("cancel_order",)
+
+
+class PendingCommand:
+    def __init__(self, id, op, frame, order_id, future):
+        self.id = id
+        self.op = op
+        self.frame = frame
+        self.order_id = order_id
+        self.future = future
+        self.created_at = time.monotonic()
+        self.sent_at = None
+        self.attempts = 0
+
+    def as_dict(self):
+        return {
+            "id": self.id,
+            "op": self.op,
+            "order_id": self.order_id,
+            "attempts": self.attempts,
+            "age": time.monotonic() - self.created_at,
+        }
+
+
+class OutboundQueue:
+    """Outbound websocket queue that batches frames and tracks unacknowledged commands.
+
+    Commands are kept keyed by request id until the exchange answers. After a
+    reconnect they are reconciled against the open orders and replayed: the
+    order id is the EIP-712 hash of the signed order, so replaying the same
+    frame can never create a second order. Commands that exhaust their attempts
+    are reported in ``lost`` and their futures resolve with a ``COMMAND_LOST``
+    error.
+    """
+
+    def __init__(self, client, max_batch=50, ack_timeout=10.0, max_attempts=3):
+        self.client = client
+        self.max_batch = max_batch
+        self.ack_timeout = ack_timeout
+        self.max_attempts = max_attempts
+        self.pending = OrderedDict()
+        self.lost = []
+        self._frames = deque()
+        self._wakeup = asyncio.Event()
+        self._ids = itertools.count(int(time.time() * 1000))
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def enqueue(self, frame):
+        self._frames.append(frame)
+        self._wakeup.set()
+
+    def enqueue_command(self, payload, order_id=None):
+        if "id" not in payload:
+            payload["id"] = next(self._ids)
+
+        future = asyncio.get_running_loop().create_future()
+        frame = json.dumps(payload)
+        tracing.mark("serialize")
+        command = PendingCommand(payload["id"], payload["op"], frame, order_id, future)
+        self.pending[command.id] = command
+        self._frames.append(command)
+        self._wakeup.set()
+        return future
+
+    def on_message(self, message):
+        # Cheap pre-check, only command responses carry an id
+        if not self.pending or '"id"' not in message:
+            return
+
+        try:
+            msg = json.loads(message)
+        except ValueError:
+            return
+
+        command = self.pending.pop(msg.get("id"), None)
+        if command is not None and not command.future.done():
+            command.future.set_result(msg)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Wake up at least every ack_timeout to expire unacknowledged commands
+            timer = loop.call_later(self.ack_timeout, self._wakeup.set)
+            try:
+                await self._wakeup.wait()
+            finally:
+                timer.cancel()
+            self._wakeup.clear()
+
+            await self._flush()
+            await self._expire()
+
+    async def _flush(self):
+        while self._frames:
+            batch = [
+                self._frames.popleft()
+                for _ in range(min(self.max_batch, len(self._frames)))
+            ]
+            for index, item in enumerate(batch):
+                if isinstance(item, PendingCommand):
+                    # Acked or lost while waiting to be resent
+                    if item.id not in self.pending:
+                        continue
+                    item.attempts += 1
+                    item.sent_at = time.monotonic()
+                    frame = item.frame
+                else:
+                    frame = item
+
+                try:
+                    await self.client.connection.send(frame)
+                except Exception as e:
+                    logger.error("Error thrown when sending on Aevo websocket")
+                    logger.error(e)
+                    logger.error(traceback.format_exc())
+                    # Unsent frames keep their place, reconnect() reconciles the commands
+                    self._frames.extendleft(reversed(batch[index:]))
+                    await self.client.reconnect()
+                    break
+
+    async def _expire(self):
+        now = time.monotonic()
+        for command in list(self.pending.values()):
+            if command.sent_at is None or now - command.sent_at < self.ack_timeout:
+                continue
+            self._retry(command)
+
+    def _retry(self, command):
+        if command.attempts >= self.max_attempts:
+            self._lose(command)
+            return
+
+        logger.warning(f"Replaying unacknowledged command: {command.as_dict()}")
+        command.sent_at = None
+        self._frames.append(command)
+        self._wakeup.set()
+
+    def _lose(self, command):
+        self.pending.pop(command.id, None)
+        self.lost.append(command.as_dict())
+        logger.error(f"Command definitively lost: {command.as_dict()}")
+        if not command.future.done():
+            command.future.set_result({"id": command.id, "error": "COMMAND_LOST"})
+
+    def _confirm(self, command):
+        self.pending.pop(command.id, None)
+        if not command.future.done():
+            command.future.set_result({"id": command.id, "reconciled": True})
+
+    async def recover(self):
+        """Reconcile unacknowledged commands with the exchange after a reconnect."""
+        if not self.pending:
+            return
+
+        open_order_ids = None
+        try:
+            orders = await asyncio.get_running_loop().run_in_executor(
+                None, self.client.rest_get_open_orders
+            )
+            if isinstance(orders, list):
+                open_order_ids = {order.get("order_id") for order in orders}
+        except Exception as e:
+            logger.error("Error thrown when fetching open orders for reconciliation")
+            logger.error(e)
+
+        queued = {item.id for item in self._frames if isinstance(item, PendingCommand)}
+        for command in list(self.pending.values()):
+            if open_order_ids is not None and command.order_id:
+                is_open = command.order_id in open_order_ids
+                if command.op in ORDER_OPS and is_open:
+                    self._confirm(command)
+                    continue
+                if command.op in CANCEL_OPS and not is_open:
+                    self._confirm(command)
+                    continue
+
+            if command.id not in queued:
+                self._retry(command)
+
+    def stats(self):
+        return {
+            "queued": len(self._frames),
+            "pending": len(self.pending),
+            "lost": len(self.lost),
+        }
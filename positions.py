@@ -0,0 +1,287 @@
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+
+from loguru import logger
+
+
+class Position:
+    def __init__(self, instrument_id, instrument_name=None):
+        self.instrument_id = str(instrument_id)
+        self.instrument_name = instrument_name
+        self.amount = 0.0  # signed, negative when short
+        self.avg_entry_price = 0.0
+        self.realized_pnl = 0.0
+        self.mark_price = None
+        self.raw = {}
+
+    @property
+    def asset(self):
+        if self.instrument_name:
+            return self.instrument_name.split("-")[0]
+        return None
+
+    @property
+    def instrument_type(self):
+        if self.raw.get("instrument_type"):
+            return self.raw["instrument_type"]
+        if self.instrument_name and self.instrument_name.endswith("-PERP"):
+            return "PERPETUAL"
+        return "OPTION"
+
+    @property
+    def unrealized_pnl(self):
+        if self.mark_price is None:
+            return None
+        return self.amount * (self.mark_price - self.avg_entry_price)
+
+    def apply_fill(self, is_buy, size, price):
+        signed = size if is_buy else -size
+        if self.amount == 0 or (self.amount > 0) == is_buy:
+            total = abs(self.amount) + size
+            self.avg_entry_price = (
+                abs(self.amount) * self.avg_entry_price + size * price
+            ) / total
+            self.amount += signed
+            return
+
+        closed = min(size, abs(self.amount))
+        direction = 1 if self.amount > 0 else -1
+        self.realized_pnl += closed * (price - self.avg_entry_price) * direction
+        self.amount += signed
+        if abs(self.amount) < 1e-12:
+            self.amount = 0.0
+            self.avg_entry_price = 0.0
+        elif (self.amount > 0) != (direction > 0):
+            # Flipped through zero, the remainder opens at the fill price
+            self.avg_entry_price = price
+
+    def as_dict(self):
+        position = dict(self.raw)
+        position.update(
+            {
+                "instrument_id": self.instrument_id,
+                "instrument_name": self.instrument_name,
+                "side": "buy" if self.amount >= 0 else "sell",
+                "amount": str(abs(self.amount)),
+                "avg_entry_price": str(self.avg_entry_price),
+            }
+        )
+        if self.mark_price is not None:
+            position["mark_price"] = str(self.mark_price)
+            position["unrealized_pnl"] = str(self.unrealized_pnl)
+        return position
+
+
+MARK_CHANNELS = ("ticker:", "markprice:", "index:")
+
+
+class PositionTracker:
+    """Positions and balance kept in memory from fills and mark prices.
+
+    Fills from the ``fills`` channel are applied incrementally, ``ticker:``,
+    ``markprice:`` and ``index:`` messages mark the positions, and the whole
+    state is periodically replaced by a REST snapshot. Fills stamped after
+    the snapshot are replayed on top of it, the ones before are skipped.
+    The state is fresh while the client's websocket is up and the last
+    snapshot is at most ``max_staleness`` seconds old, a flat account gets no
+    messages and still is. With the socket down fills may be missed and
+    reads refresh from REST before answering.
+    """
+
+    def __init__(
+        self, client, max_staleness=60.0, reconcile_interval=30.0, keep_fills=1000
+    ):
+        self.client = client
+        self.max_staleness = max_staleness
+        self.reconcile_interval = reconcile_interval
+        self.positions = {}
+        self.balance = None
+        self.portfolio = {}
+        self.fills = deque(maxlen=keep_fills)  # (exchange time in ns, fill)
+        self.snapshot_time = 0  # exchange time in ns of the last snapshot
+        self.marks_pending = False
+        self.last_reconciled = 0.0
+        self._lock = threading.Lock()
+
+    def stream_alive(self):
+        connection = getattr(self.client, "connection", None)
+        return connection is not None and getattr(connection, "open", False)
+
+    def is_stale(self):
+        age = time.time() - self.last_reconciled
+        if not self.stream_alive():
+            # Only a snapshot of the last second, reads in a burst share it
+            return age > 1.0
+        return age > self.max_staleness
+
+    def _now_ns(self):
+        clock = getattr(self.client, "clock", None)
+        return int((clock.now() if clock is not None else time.time()) * 1e9)
+
+    def _position(self, instrument_id, instrument_name=None):
+        position = self.positions.get(str(instrument_id))
+        if position is None:
+            position = self.positions[str(instrument_id)] = Position(
+                instrument_id, instrument_name
+            )
+            self.marks_pending = True
+        elif instrument_name and not position.instrument_name:
+            position.instrument_name = instrument_name
+        return position
+
+    def handle(self, message):
+        if isinstance(message, (str, bytes)):
+            message = json.loads(message)
+
+        channel = message.get("channel") or ""
+        data = message.get("data") or {}
+        if channel != "fills" and not channel.startswith(MARK_CHANNELS):
+            return
+        with self._lock:
+            if channel == "fills":
+                fill = data.get("fill")
+                if fill:
+                    created = fill.get("created_timestamp")
+                    created = int(created) if created else self._now_ns()
+                    self.fills.append((created, fill))
+                    if created > self.snapshot_time:
+                        self.apply_fill(fill)
+            elif channel.startswith("ticker:"):
+                for ticker in data.get("tickers") or ():
+                    mark = (ticker.get("mark") or {}).get("price")
+                    if mark:
+                        self._mark(ticker.get("instrument_id"), float(mark))
+            elif channel.startswith("markprice:"):
+                for price in data.get("prices") or ():
+                    self._mark(price.get("instrument_id"), float(price["mark_price"]))
+            elif channel.startswith("index:") and data.get("price"):
+                self._mark_asset(channel[len("index:") :], float(data["price"]))
+
+    def apply_fill(self, fill):
+        position = self._position(fill["instrument_id"], fill.get("instrument_name"))
+        position.apply_fill(
+            fill.get("side") == "buy", float(fill["filled"]), float(fill["price"])
+        )
+
+    def _mark(self, instrument_id, price):
+        position = self.positions.get(str(instrument_id))
+        if position is not None:
+            position.mark_price = price
+
+    def _mark_asset(self, asset, price):
+        # The index only marks positions that get no mark price of their own
+        for position in self.positions.values():
+            if position.asset == asset and position.mark_price is None:
+                position.mark_price = price
+
+    def reconcile(self, portfolio=None, positions=None, snapshot_time=None):
+        """Replace the in-memory state by REST snapshots of portfolio and positions.
+
+        ``snapshot_time`` is the exchange time in ns the snapshot was taken at,
+        the ``timestamp`` of the positions response when it has one, else the
+        midpoint of the requests.
+        """
+        if portfolio is None or positions is None:
+            sent = self._now_ns()
+            portfolio = self.client.rest_get_portfolio()
+            positions = self.client.rest_get_positions()
+            snapshot_time = (sent + self._now_ns()) // 2
+        if isinstance(positions, dict):
+            snapshot_time = int(positions.get("timestamp") or snapshot_time or 0)
+            positions = positions.get("positions")
+        if not isinstance(positions, list) or portfolio.get("error"):
+            logger.error(f"Cannot reconcile positions: {portfolio} {positions}")
+            return False
+
+        with self._lock:
+            if snapshot_time and snapshot_time < self.snapshot_time:
+                # A newer snapshot got in first
+                return True
+            self.portfolio = portfolio
+            self.balance = portfolio.get("balance")
+            fresh = {}
+            for raw in positions:
+                position = Position(raw["instrument_id"], raw.get("instrument_name"))
+                amount = float(raw.get("amount") or 0)
+                position.amount = amount if raw.get("side") == "buy" else -amount
+                position.avg_entry_price = float(raw.get("avg_entry_price") or 0)
+                if raw.get("mark_price"):
+                    position.mark_price = float(raw["mark_price"])
+                position.raw = raw
+                fresh[position.instrument_id] = position
+            if fresh.keys() - self.positions.keys():
+                self.marks_pending = True
+
+            previous, self.positions = self.positions, fresh
+            self.snapshot_time = snapshot_time or self._now_ns()
+            for created, fill in self.fills:
+                if created > self.snapshot_time:
+                    self.apply_fill(fill)
+            # Replayed fills were applied before, their pnl is already counted
+            for instrument_id, position in self.positions.items():
+                if instrument_id in previous:
+                    position.realized_pnl = previous[instrument_id].realized_pnl
+            self.last_reconciled = time.time()
+        return True
+
+    async def reconcile_async(self):
+        loop = asyncio.get_running_loop()
+        sent = self._now_ns()
+        portfolio = await loop.run_in_executor(None, self.client.rest_get_portfolio)
+        positions = await loop.run_in_executor(None, self.client.rest_get_positions)
+        reconciled = self.reconcile(portfolio, positions, (sent + self._now_ns()) // 2)
+        if self.marks_pending:
+            await self.subscribe_marks()
+        return reconciled
+
+    async def run(self):
+        while True:
+            try:
+                await self.reconcile_async()
+            except Exception as e:
+                logger.error("Error thrown when reconciling positions")
+                logger.error(e)
+            await asyncio.sleep(self.reconcile_interval)
+
+    def _refresh_if_stale(self):
+        if self.is_stale():
+            self.reconcile()
+
+    def get_positions(self):
+        self._refresh_if_stale()
+        with self._lock:
+            return [
+                position.as_dict()
+                for position in self.positions.values()
+                if position.amount
+            ]
+
+    def get_balance(self):
+        self._refresh_if_stale()
+        return self.balance
+
+    def mark_channels(self):
+        """Mark price and index channels that keep the held positions marked."""
+        channels = set()
+        with self._lock:
+            for position in self.positions.values():
+                if position.asset and position.amount:
+                    channels.add(
+                        f"markprice:{position.asset}:{position.instrument_type}"
+                    )
+                    channels.add(f"index:{position.asset}")
+        return sorted(channels)
+
+    async def subscribe_marks(self):
+        """Subscribes the mark channels of positions opened since the last call."""
+        self.marks_pending = False
+        channels = [
+            channel
+            for channel in self.mark_channels()
+            if channel not in self.client.subscriptions
+        ]
+        if channels:
+            await self.client.subscribe(channels)
@@ -0,0 +1,112 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from loguru import logger
+
+# Leaf frames of threads blocked waiting for work rather than running
+IDLE_FRAMES = (
+    "select (selectors.py",
+    "wait (threading.py",
+    "_worker (thread.py",
+    "accept (socket.py",
+    "serve_forever (socketserver.py",
+)
+
+
+def _label(code):
+    # ';' separates frames in the collapsed format
+    filename = os.path.basename(code.co_filename).replace(";", ":")
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+class Profile:
+    """Stacks counted by one run, read-only so it can be rendered while the
+    next run samples."""
+
+    def __init__(self, stacks, samples, interval, seconds):
+        self.stacks = tuple(stacks.most_common())  # (stack, count), most first
+        self.samples = samples
+        self.interval = interval
+        self.seconds = seconds
+
+    def collapsed(self, min_count=1):
+        return "\n".join(
+            f"{stack} {count}" for stack, count in self.stacks if count >= min_count
+        )
+
+    def top(self, count=20, include_idle=False):
+        """Functions by the share of samples they were running in (self time)."""
+        leaves = Counter()
+        for stack, hits in self.stacks:
+            leaf = stack.rsplit(";", 1)[-1]
+            if include_idle or not leaf.startswith(IDLE_FRAMES):
+                leaves[leaf] += hits
+        total = sum(leaves.values()) or 1
+        return [
+            {"function": name, "samples": hits, "share": hits / total}
+            for name, hits in leaves.most_common(count)
+        ]
+
+
+class SamplingProfiler:
+    """Samples the stacks of every thread with ``sys._current_frames``.
+
+    Nothing is installed in the profiled code, a background thread wakes up
+    every ``interval`` seconds, walks the frames and counts the stacks, so
+    the cost is only paid while a profile runs. Output is in the collapsed
+    format of flamegraph.pl and speedscope: ``thread;outer;...;inner count``.
+    The event loop thread shows the coroutine running at the time, or the
+    selector when it is idle. Each run returns its own ``Profile``.
+    """
+
+    def __init__(self, interval=0.005, max_depth=128):
+        self.interval = interval
+        self.max_depth = max_depth
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._lock.locked()
+
+    def sample(self, stacks, skip=()):
+        """Adds the current stack of every thread but ``skip`` to ``stacks``."""
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident in skip:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                stack.append(_label(frame.f_code))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}"))
+            stacks[";".join(reversed(stack))] += 1
+
+    def run(self, seconds):
+        """Samples for ``seconds`` in the calling thread and returns the
+        ``Profile``, None if a run is already in progress."""
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            samples = 0
+            stacks = Counter()
+            skip = {threading.get_ident()}
+            started = time.perf_counter()
+            deadline = started + seconds
+            next_sample = started
+            while True:
+                now = time.perf_counter()
+                if now >= deadline:
+                    break
+                if now >= next_sample:
+                    self.sample(stacks, skip)
+                    samples += 1
+                    next_sample += self.interval
+                time.sleep(max(0.0, min(next_sample, deadline) - time.perf_counter()))
+            elapsed = time.perf_counter() - started
+            logger.info(f"Profiled {samples} samples in {elapsed:.1f}s")
+            return Profile(stacks, samples, self.interval, elapsed)
+        finally:
+            self._lock.release()
@@ -0,0 +1,65 @@
+import math
+
+MAX_UINT256 = 2**256 - 1
+
+# Slack in ticks for float noise, 100.01 * 10**6 is 100009999.99999999
+EPSILON = 1e-6
+
+
+class Quantizer:
+    """Fixed-point prices and amounts of one instrument.
+
+    ``price`` and ``amount`` snap a float to the instrument's tick and lot and
+    return the scaled integer used both in the order payload and in the
+    EIP-712 struct. Buy prices round down and sell prices up so a snapped
+    order is never more aggressive than asked, amounts round down.
+    """
+
+    def __init__(
+        self,
+        price_step=None,
+        amount_step=None,
+        price_decimals=10**6,
+        amount_decimals=10**6,
+    ):
+        self.price_decimals = price_decimals
+        self.amount_decimals = amount_decimals
+        self.price_tick = self._tick(price_step, price_decimals)
+        self.amount_lot = self._tick(amount_step, amount_decimals)
+
+    @staticmethod
+    def _tick(step, decimals):
+        if not step:
+            return 1
+        return max(1, int(round(float(step) * decimals)))
+
+    @classmethod
+    def from_market(cls, market, price_decimals=10**6, amount_decimals=10**6):
+        return cls(
+            market.get("price_step"),
+            market.get("amount_step"),
+            price_decimals,
+            amount_decimals,
+        )
+
+    def price(self, price, is_buy):
+        if price is None:
+            # Market orders: any price on the buy side, none on the sell side
+            return MAX_UINT256 if is_buy else 0
+        ticks = price * self.price_decimals / self.price_tick
+        if is_buy:
+            return math.floor(ticks + EPSILON) * self.price_tick
+        return math.ceil(ticks - EPSILON) * self.price_tick
+
+    def amount(self, amount):
+        lots = amount * self.amount_decimals / self.amount_lot
+        return math.floor(lots + EPSILON) * self.amount_lot
+
+    def scale(self, is_buy, price, amount):
+        return self.price(price, is_buy), self.amount(amount)
+
+    def to_price(self, scaled):
+        return scaled / self.price_decimals
+
+    def to_amount(self, scaled):
+        return scaled / self.amount_decimals
@@ -0,0 +1,244 @@
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+
+from loguru import logger
+
+# Per record: receive timestamp (ns), channel length, payload length
+RECORD_HEADER = struct.Struct("<QHI")
+# Per block in the .idx file: offset, compressed length, records, first ts, last ts
+INDEX_ENTRY = struct.Struct("<QIIQQ")
+
+SEGMENT_SUFFIX = ".seg"
+INDEX_SUFFIX = ".idx"
+
+_STOP = object()
+
+
+def frame_channel(frame):
+    """Channel of a raw frame without parsing the whole JSON document."""
+    start = frame.find(b'"channel"')
+    if start < 0:
+        return b""
+    start = frame.find(b'"', frame.find(b":", start + 9)) + 1
+    return frame[start : frame.find(b'"', start)]
+
+
+class MarketDataRecorder:
+    """Tees websocket frames into segmented, block-compressed, append-only files.
+
+    ``record`` only puts the frame on a bounded queue, a background thread
+    extracts the channel, packs records into blocks, compresses them with zlib
+    and appends them to the current segment together with an index entry.
+    Frames are counted in ``dropped`` when the writer cannot keep up.
+    """
+
+    def __init__(
+        self,
+        directory,
+        prefix="aevo",
+        block_size=256 * 1024,
+        block_interval=1.0,
+        segment_size=256 * 1024 * 1024,
+        buffer_size=100000,
+        compression_level=1,
+    ):
+        self.directory = directory
+        self.prefix = prefix
+        self.block_size = block_size
+        self.block_interval = block_interval
+        self.segment_size = segment_size
+        self.compression_level = compression_level
+        self.recorded = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=buffer_size)
+        self._thread = None
+        self._segment = None
+        self._index = None
+        self._block = bytearray()
+        self._block_count = 0
+        self._block_first = 0
+        self._block_last = 0
+        self._block_started = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="aevo-recorder", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    def record(self, frame, received_at=None):
+        if received_at is None:
+            received_at = time.time_ns()
+        try:
+            self._queue.put_nowait((received_at, frame))
+        except queue.Full:
+            self.dropped += 1
+
+    async def tee(self, messages):
+        async for message in messages:
+            self.record(message)
+            yield message
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.block_interval)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                break
+            if item is not None:
+                try:
+                    self._append(*item)
+                except Exception as e:
+                    logger.error("Error thrown when recording frame")
+                    logger.error(e)
+
+            if self._block and (
+                len(self._block) >= self.block_size
+                or time.monotonic() - self._block_started >= self.block_interval
+            ):
+                self._flush_block()
+
+        self._flush_block()
+        self._close_segment()
+
+    def _append(self, received_at, frame):
+        if isinstance(frame, str):
+            frame = frame.encode()
+        channel = frame_channel(frame)
+
+        if not self._block:
+            self._block_first = received_at
+            self._block_started = time.monotonic()
+        self._block += RECORD_HEADER.pack(received_at, len(channel), len(frame))
+        self._block += channel
+        self._block += frame
+        self._block_count += 1
+        self._block_last = received_at
+        self.recorded += 1
+
+    def _flush_block(self):
+        if not self._block:
+            return
+
+        if self._segment is None:
+            path = os.path.join(
+                self.directory, f"{self.prefix}-{self._block_first:020d}"
+            )
+            self._segment = open(path + SEGMENT_SUFFIX, "ab")
+            self._index = open(path + INDEX_SUFFIX, "ab")
+
+        compressed = zlib.compress(bytes(self._block), self.compression_level)
+        offset = self._segment.tell()
+        self._segment.write(compressed)
+        self._segment.flush()
+        # The index entry goes last so readers never see a block that is not written
+        self._index.write(
+            INDEX_ENTRY.pack(
+                offset,
+                len(compressed),
+                self._block_count,
+                self._block_first,
+                self._block_last,
+            )
+        )
+        self._index.flush()
+
+        self._block = bytearray()
+        self._block_count = 0
+        if self._segment.tell() >= self.segment_size:
+            self._close_segment()
+
+    def _close_segment(self):
+        if self._segment is not None:
+            self._segment.close()
+            self._index.close()
+            self._segment = None
+            self._index = None
+
+    def stats(self):
+        return {
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "buffered": self._queue.qsize(),
+        }
+
+
+class RecordingReader:
+    """Reads a time range back from recorder segments through memory mapping.
+
+    Only the blocks whose index entry overlaps the range are decompressed.
+    """
+
+    def __init__(self, directory, prefix="aevo"):
+        self.directory = directory
+        self.prefix = prefix
+
+    def segments(self):
+        names = sorted(
+            name
+            for name in os.listdir(self.directory)
+            if name.startswith(f"{self.prefix}-") and name.endswith(SEGMENT_SUFFIX)
+        )
+        return [
+            os.path.join(self.directory, name[: -len(SEGMENT_SUFFIX)]) for name in names
+        ]
+
+    def index(self, path):
+        with open(path + INDEX_SUFFIX, "rb") as f:
+            data = f.read()
+        usable = len(data) - len(data) % INDEX_ENTRY.size
+        return list(INDEX_ENTRY.iter_unpack(data[:usable]))
+
+    def blocks(self, start=None, end=None):
+        for path in self.segments():
+            entries = [
+                entry
+                for entry in self.index(path)
+                if (start is None or entry[4] >= start)
+                and (end is None or entry[3] <= end)
+            ]
+            if not entries:
+                continue
+
+            with open(path + SEGMENT_SUFFIX, "rb") as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    for offset, length, count, first, last in entries:
+                        yield zlib.decompress(mm[offset : offset + length])
+
+    def read(self, start=None, end=None):
+        """Yield (receive timestamp ns, channel, frame) for every record in range."""
+        header_size = RECORD_HEADER.size
+        for block in self.blocks(start, end):
+            position = 0
+            while position < len(block):
+                received_at, channel_length, frame_length = RECORD_HEADER.unpack_from(
+                    block, position
+                )
+                position += header_size
+                channel = block[position : position + channel_length]
+                position += channel_length
+                frame = block[position : position + frame_length]
+                position += frame_length
+
+                if start is not None and received_at < start:
+                    continue
+                if end is not None and received_at > end:
+                    return
+                yield received_at, channel.decode(), frame.decode()
@@ -0,0 +1,156 @@
+import asyncio
+import re
+import time
+from collections import OrderedDict
+
+from loguru import logger
+
+from aevo import CHANNEL_RE, AevoClient
+
+# Fields unique to one update within a channel, also nested as in data.fill.
+# Timestamps are not: one taker order sweeping several levels produces
+# trades with the same timestamp.
+UPDATE_ID_RE = re.compile(r'"(trade_id|sequence|seq)"\s*:\s*"?([^",}\s]+)')
+
+
+def update_key(message):
+    """Dedup key of a websocket frame, read from the raw string: the channel
+    plus a unique id of the update, else the frame itself. Copies of one
+    update are the same bytes on every connection."""
+    channel = CHANNEL_RE.search(message)
+    if channel is None:
+        # Command responses and subscription confirmations
+        return message
+    update_id = UPDATE_ID_RE.search(message)
+    if update_id is None:
+        return message
+    return (channel.group(1), update_id.group(1), update_id.group(2))
+
+
+class ConnectionStats:
+    def __init__(self, index):
+        self.index = index
+        self.received = 0
+        self.wins = 0
+        self.duplicates = 0
+        self.lag_total = 0.0
+        self.lag_max = 0.0
+
+    def as_dict(self, delivered):
+        return {
+            "connection": self.index,
+            "received": self.received,
+            "wins": self.wins,
+            "win_rate": self.wins / delivered if delivered else 0.0,
+            "duplicates": self.duplicates,
+            "mean_lag_ms": (
+                self.lag_total / self.duplicates * 1000 if self.duplicates else 0.0
+            ),
+            "max_lag_ms": self.lag_max * 1000,
+        }
+
+
+class RedundantAevoClient(AevoClient):
+    """AevoClient reading the same subscriptions over several hot-standby websockets.
+
+    Every update is delivered once, from whichever connection received it first,
+    so a slow or reconnecting connection is hidden from the strategy. Commands
+    and REST calls go through the primary connection only.
+    """
+
+    def __init__(self, connections=2, dedup_window=10000, **kwargs):
+        if connections < 1:
+            raise ValueError("connections must be at least 1")
+
+        super().__init__(**kwargs)
+        self.standbys = [AevoClient(**kwargs) for _ in range(connections - 1)]
+        self.dedup_window = dedup_window
+        self.delivered = 0
+        self.stats = [ConnectionStats(i) for i in range(connections)]
+        self._seen = OrderedDict()
+
+    @property
+    def clients(self):
+        return [self] + self.standbys
+
+    async def open_connection(self, extra_headers={}):
+        await asyncio.gather(
+            super().open_connection(extra_headers),
+            *[client.open_connection(extra_headers) for client in self.standbys],
+        )
+
+    async def close_connection(self):
+        await asyncio.gather(
+            super().close_connection(),
+            *[client.close_connection() for client in self.standbys],
+        )
+
+    async def _reopen_connection(self):
+        # Only the primary connection, the standbys keep streaming meanwhile
+        await AevoClient.close_connection(self)
+        await AevoClient.open_connection(self, self.extra_headers)
+        await self.resubscribe()
+
+    async def subscribe(self, channels):
+        await asyncio.gather(
+            super().subscribe(channels),
+            *[client.subscribe(channels) for client in self.standbys],
+        )
+
+    async def _pump(self, index, client, queue, read_timeout, backoff, on_disconnect):
+        if client is self:
+            messages = super().read_messages(read_timeout, backoff, on_disconnect)
+        else:
+            messages = client.read_messages(read_timeout, backoff)
+
+        async for message in messages:
+            await queue.put((index, time.monotonic(), message))
+
+    def _accept(self, index, received_at, message):
+        stats = self.stats[index]
+        stats.received += 1
+
+        key = update_key(message)
+        seen = self._seen.get(key)
+        if seen is None:
+            stats.wins += 1
+            self.delivered += 1
+            self._seen[key] = [received_at, 1]
+            if len(self._seen) > self.dedup_window:
+                self._seen.popitem(last=False)
+            return True
+
+        lag = received_at - seen[0]
+        stats.duplicates += 1
+        stats.lag_total += lag
+        stats.lag_max = max(stats.lag_max, lag)
+
+        # Every connection has delivered its copy, nothing more to suppress
+        seen[1] += 1
+        if seen[1] >= len(self.stats):
+            del self._seen[key]
+        return False
+
+    async def read_messages(self, read_timeout=0.1, backoff=0.1, on_disconnect=None):
+        queue = asyncio.Queue()
+        tasks = [
+            asyncio.create_task(
+                self._pump(index, client, queue, read_timeout, backoff, on_disconnect)
+            )
+            for index, client in enumerate(self.clients)
+        ]
+        try:
+            while True:
+                index, received_at, message = await queue.get()
+                if self._accept(index, received_at, message):
+                    yield message
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def connection_stats(self):
+        return [stats.as_dict(self.delivered) for stats in self.stats]
+
+    def log_connection_stats(self):
+        for stats in self.connection_stats():
+            logger.info(stats)
@@ -0,0 +1,82 @@
+import asyncio
+import json
+
+from loguru import logger
+
+from aevo import AevoClient
+from recorder import RecordingReader
+
+NS = 10**9
+
+
+class ReplayClient(AevoClient):
+    """AevoClient whose websocket is a recording made by MarketDataRecorder.
+
+    ``read_messages`` yields the recorded frames of the subscribed channels,
+    paced by their receive timestamps divided by ``speed`` (1.0 is real time),
+    or as fast as possible when ``speed`` is None. Commands sent by the strategy
+    are kept in ``sent`` instead of going to the network.
+    """
+
+    def __init__(
+        self,
+        directory,
+        prefix="aevo",
+        speed=None,
+        start=None,
+        end=None,
+        filter_subscriptions=True,
+        yield_every=1000,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.reader = RecordingReader(directory, prefix)
+        self.speed = speed
+        self.start = start
+        self.end = end
+        self.filter_subscriptions = filter_subscriptions
+        self.yield_every = yield_every
+        self.sent = []
+        self.replayed = 0
+        self.current_timestamp = None
+
+    async def open_connection(self, extra_headers={}):
+        logger.info(f"Replaying Aevo websocket from {self.reader.directory}")
+
+    async def close_connection(self):
+        pass
+
+    async def send(self, data):
+        self.sent.append(data)
+
+    async def send_command(self, payload, order_id=None):
+        self.sent.append(json.dumps(payload))
+
+    async def read_messages(self, read_timeout=0.1, backoff=0.1, on_disconnect=None):
+        loop = asyncio.get_running_loop()
+        first_timestamp = None
+        started_at = None
+
+        for timestamp, channel, frame in self.reader.read(self.start, self.end):
+            # Responses of the recorded session are skipped along with other channels
+            if self.filter_subscriptions and channel not in self.subscriptions:
+                continue
+
+            if self.speed:
+                if first_timestamp is None:
+                    first_timestamp = timestamp
+                    started_at = loop.time()
+                delay = (
+                    started_at
+                    + (timestamp - first_timestamp) / NS / self.speed
+                    - loop.time()
+                )
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            elif self.replayed % self.yield_every == 0:
+                # Let other tasks run without paying for a sleep per message
+                await asyncio.sleep(0)
+
+            self.current_timestamp = timestamp
+            self.replayed += 1
+            yield frame
@@ -0,0 +1,181 @@
+import asyncio
+
+from loguru import logger
+
+from oms import LIVE
+
+COUNTERS = {"create": "created", "edit": "edited", "cancel": "cancelled"}
+
+
+class Quote:
+    def __init__(self, instrument_id, is_buy, price, amount, order_id=None):
+        self.instrument_id = str(instrument_id)
+        self.is_buy = is_buy
+        self.price = price
+        self.amount = amount
+        self.order_id = order_id
+
+    def as_dict(self):
+        return {
+            "instrument_id": self.instrument_id,
+            "side": "buy" if self.is_buy else "sell",
+            "price": self.price,
+            "amount": self.amount,
+            "order_id": self.order_id,
+        }
+
+
+class Requoter:
+    """Keeps live quotes in line with a desired set using as few commands as possible.
+
+    Desired quotes are given per instrument as ``(is_buy, price, amount)``
+    levels and matched to live quotes by side and level. A level is edited
+    only when its price moves by at least ``price_ticks`` ticks or its size by
+    more than ``size_threshold``, otherwise nothing is signed or sent for it.
+    Missing levels are created and extra ones cancelled, and all commands of
+    one cycle are issued together so the outbound queue sends them as a batch.
+    Ticks are the instrument's from ``client.load_markets``, ``tick_size`` for
+    instruments without loaded specs. With the outbound queue a quote only
+    replaces the live one once acked, a rejected edit leaves the old order.
+    """
+
+    def __init__(
+        self, client, tick_size=0.01, price_ticks=1, size_threshold=0.0, post_only=True
+    ):
+        self.client = client
+        self.tick_size = tick_size
+        self.price_ticks = price_ticks
+        self.size_threshold = size_threshold
+        self.post_only = post_only
+        self.live = {}  # (instrument_id, is_buy, level) -> Quote
+        self.counts = {"created": 0, "edited": 0, "cancelled": 0, "skipped": 0}
+
+    def _is_live(self, quote):
+        # Quotes filled or cancelled on the exchange are requoted from scratch
+        oms = self.client.oms
+        if oms is None or quote.order_id is None:
+            return True
+        order = oms.get(quote.order_id)
+        return order is None or order.state in LIVE
+
+    def _tick_size(self, instrument_id):
+        quantizer = getattr(self.client, "quantizers", {}).get(int(instrument_id))
+        if quantizer is None:
+            return self.tick_size
+        return quantizer.to_price(quantizer.price_tick)
+
+    def _moved(self, quote, price, amount):
+        price_moved = abs(price - quote.price) >= (
+            self.price_ticks * self._tick_size(quote.instrument_id) - 1e-12
+        )
+        size_moved = abs(amount - quote.amount) > self.size_threshold
+        return price_moved or size_moved
+
+    def diff(self, desired):
+        """Commands needed to move from the live quotes to ``desired``.
+
+        Returns a list of ``(op, key, quote)`` with op one of create, edit,
+        cancel. Unchanged levels produce no entry.
+        """
+        desired = {
+            str(instrument_id): levels for instrument_id, levels in desired.items()
+        }
+        commands = []
+        wanted = set()
+        stale = []
+        for instrument_id, levels in desired.items():
+            depth = {True: 0, False: 0}
+            for is_buy, price, amount in levels:
+                key = (instrument_id, is_buy, depth[is_buy])
+                depth[is_buy] += 1
+                wanted.add(key)
+
+                quote = self.live.get(key)
+                if quote is not None and not self._is_live(quote):
+                    quote = None
+                if quote is None:
+                    commands.append(
+                        ("create", key, Quote(instrument_id, is_buy, price, amount))
+                    )
+                elif self._moved(quote, price, amount):
+                    commands.append(
+                        (
+                            "edit",
+                            key,
+                            Quote(instrument_id, is_buy, price, amount, quote.order_id),
+                        )
+                    )
+                else:
+                    self.counts["skipped"] += 1
+
+        for key, quote in self.live.items():
+            # Instruments absent from ``desired`` keep their quotes
+            if key[0] not in desired or key in wanted:
+                continue
+            if self._is_live(quote):
+                commands.append(("cancel", key, quote))
+            else:
+                stale.append(key)
+        for key in stale:
+            self.live.pop(key)
+        return commands
+
+    async def _apply(self, op, key, quote):
+        if op in ("create", "edit"):
+            if op == "create":
+                order_id, ack = await self.client.create_order(
+                    quote.instrument_id,
+                    quote.is_buy,
+                    quote.price,
+                    quote.amount,
+                    post_only=self.post_only,
+                    ack=True,
+                )
+            else:
+                order_id, ack = await self.client.edit_order(
+                    quote.order_id,
+                    quote.instrument_id,
+                    quote.is_buy,
+                    quote.price,
+                    quote.amount,
+                    post_only=self.post_only,
+                    ack=True,
+                )
+            if ack is not None:
+                response = await ack
+                if response.get("error"):
+                    # The quote being replaced, if any, is still live
+                    logger.warning(f"Requote {op} rejected: {response['error']}")
+                    return
+            quote.order_id = order_id
+            self.live[key] = quote
+        else:
+            await self.client.cancel_order(quote.order_id)
+            self.live.pop(key, None)
+        self.counts[COUNTERS[op]] += 1
+
+    async def update(self, desired):
+        """Requote to ``desired``, a mapping of instrument id to levels."""
+        commands = self.diff(desired)
+        if not commands:
+            return commands
+
+        results = await asyncio.gather(
+            *(self._apply(*command) for command in commands), return_exceptions=True
+        )
+        for command, result in zip(commands, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error thrown when requoting {command[0]}")
+                logger.error(result)
+        return commands
+
+    async def cancel_all(self, instrument_id=None):
+        desired = {
+            key[0]: []
+            for key in self.live
+            if instrument_id is None or key[0] == str(instrument_id)
+        }
+        return await self.update(desired)
+
+    def quotes(self):
+        return [quote.as_dict() for quote in self.live.values()]
@@ -0,0 +1,264 @@
+import asyncio
+import json
+import threading
+import time
+
+from loguru import logger
+
+INSUFFICIENT_MARGIN = "INSUFFICIENT_AVAILABLE_MARGIN"
+MAX_SIZE_EXCEEDED = "MAX_ORDER_SIZE_EXCEEDED"
+MAX_NOTIONAL_EXCEEDED = "MAX_ORDER_NOTIONAL_EXCEEDED"
+PRICE_OUTSIDE_BAND = "PRICE_OUTSIDE_BAND"
+MARK_UNAVAILABLE = "MARK_PRICE_UNAVAILABLE"
+
+
+class RiskRejected(ValueError):
+    """Raised for an order failing pre-trade risk, ``response`` is the
+    ``{"error": CODE}`` rejection."""
+
+    def __init__(self, response):
+        super().__init__(response["error"])
+        self.response = response
+
+
+class PreTradeRisk:
+    """Local pre-trade checks run before an order is signed.
+
+    Available margin is cached from ``rest_get_account`` / ``rest_get_portfolio``
+    and decremented by the estimated margin of every order sent until the next
+    refresh, limit prices must stay within ``price_band`` of the local mark and
+    sizes within the per-instrument ``max_size`` / ``max_notional``. Checks are
+    dictionary lookups, an order that would obviously be rejected never
+    reaches the signer. Marks of ``instruments`` are fetched by ``watch_marks``
+    and kept by their mark price channel. A market order without a mark is
+    rejected only when a notional limit or the margin check needs its value;
+    without a margin figure the margin check is skipped and the exchange
+    decides.
+    """
+
+    def __init__(
+        self,
+        client=None,
+        margin_rate=0.1,
+        price_band=0.1,
+        max_size=None,
+        max_notional=None,
+        limits=None,
+        positions=None,
+        instruments=None,
+        refresh_interval=30.0,
+    ):
+        self.client = client
+        self.margin_rate = margin_rate
+        self.price_band = price_band
+        self.max_size = max_size
+        self.max_notional = max_notional
+        self.limits = {str(k): v for k, v in (limits or {}).items()}
+        # PositionTracker, orders reducing a position need no margin
+        self.positions = positions
+        self.instruments = {str(i) for i in instruments or () if i is not None}
+        self.refresh_interval = refresh_interval
+        self.marks = {}
+        self.available_margin = None
+        self.reserved = 0.0
+        self.refreshed_at = 0.0
+        self.rejected = {}
+        self._lock = threading.Lock()
+        if client is not None:
+            client.risk = self
+
+    def _limit(self, instrument_id, name):
+        limits = self.limits.get(instrument_id)
+        if limits and name in limits:
+            return limits[name]
+        return getattr(self, name)
+
+    def _reduces(self, instrument_id, is_buy, quantity):
+        if self.positions is None:
+            return False
+        position = self.positions.positions.get(instrument_id)
+        if position is None or not position.amount:
+            return False
+        return (position.amount < 0) == is_buy and quantity <= abs(position.amount)
+
+    def margin_for(self, instrument_id, is_buy, price, quantity):
+        if price is None or self._reduces(instrument_id, is_buy, quantity):
+            return 0.0
+        return price * quantity * self._limit(instrument_id, "margin_rate")
+
+    def check(self, instrument_id, is_buy, limit_price, quantity):
+        """Returns None when the order may go out, otherwise ``{"error": CODE}``.
+
+        ``limit_price`` is None for market orders, which are valued at the mark.
+        """
+        instrument_id = str(instrument_id)
+        error = self._check(instrument_id, is_buy, limit_price, quantity)
+        if error:
+            self.rejected[error] = self.rejected.get(error, 0) + 1
+            return {"error": error}
+        return None
+
+    def check_and_reserve(self, instrument_id, is_buy, limit_price, quantity):
+        """``check`` and the margin reservation in one step, concurrent orders
+        cannot both pass against the same margin. Returns ``(rejected, reserved)``."""
+        with self._lock:
+            rejected = self.check(instrument_id, is_buy, limit_price, quantity)
+            if rejected:
+                return rejected, 0.0
+            reserved = self._required(str(instrument_id), is_buy, limit_price, quantity)
+            self.reserved += reserved
+        return None, reserved
+
+    def _check(self, instrument_id, is_buy, limit_price, quantity):
+        max_size = self._limit(instrument_id, "max_size")
+        if max_size is not None and quantity > max_size:
+            return MAX_SIZE_EXCEEDED
+
+        mark = self.marks.get(instrument_id)
+        band = self._limit(instrument_id, "price_band")
+        if limit_price is not None and mark and band is not None:
+            if is_buy and limit_price > mark * (1 + band):
+                return PRICE_OUTSIDE_BAND
+            if not is_buy and limit_price < mark * (1 - band):
+                return PRICE_OUTSIDE_BAND
+
+        price = limit_price if limit_price is not None else mark
+        max_notional = self._limit(instrument_id, "max_notional")
+        if not price and (
+            max_notional is not None
+            or (
+                self.available_margin is not None
+                and not self._reduces(instrument_id, is_buy, quantity)
+            )
+        ):
+            # A market order that cannot be valued against a limit needing it
+            return MARK_UNAVAILABLE
+        if price is not None and max_notional is not None:
+            if price * quantity > max_notional:
+                return MAX_NOTIONAL_EXCEEDED
+
+        if self.available_margin is not None:
+            required = self.margin_for(instrument_id, is_buy, price, quantity)
+            if required > self.available_margin - self.reserved:
+                return INSUFFICIENT_MARGIN
+        return None
+
+    def _required(self, instrument_id, is_buy, limit_price, quantity):
+        price = (
+            limit_price if limit_price is not None else self.marks.get(instrument_id)
+        )
+        return self.margin_for(instrument_id, is_buy, price, quantity)
+
+    def release(self, amount):
+        with self._lock:
+            self.reserved = max(0.0, self.reserved - amount)
+
+    def on_response(self, reserved, response):
+        if isinstance(response, dict) and response.get("error"):
+            self.release(reserved)
+
+    def watch_ack(self, reserved, ack):
+        ack.add_done_callback(
+            lambda f: f.cancelled() or self.on_response(reserved, f.result())
+        )
+
+    def update_mark(self, instrument_id, price):
+        self.marks[str(instrument_id)] = float(price)
+
+    def handle(self, message):
+        if isinstance(message, (str, bytes)):
+            message = json.loads(message)
+
+        channel = message.get("channel") or ""
+        data = message.get("data") or {}
+        if channel.startswith("ticker:"):
+            for ticker in data.get("tickers") or ():
+                mark = (ticker.get("mark") or {}).get("price")
+                if mark:
+                    self.update_mark(ticker["instrument_id"], mark)
+        elif channel.startswith("markprice:"):
+            for price in data.get("prices") or ():
+                self.update_mark(price["instrument_id"], price["mark_price"])
+
+    def missing_marks(self):
+        return self.instruments - self.marks.keys()
+
+    async def watch_marks(self):
+        """Fetches the marks of ``instruments`` and subscribes their mark price
+        channels. Returns the instruments still without a mark."""
+        if not self.instruments:
+            return set()
+        loop = asyncio.get_running_loop()
+        markets = await loop.run_in_executor(None, self.client.get_markets)
+        channels = set()
+        for market in markets if isinstance(markets, list) else ():
+            instrument_id = str(market.get("instrument_id"))
+            if instrument_id not in self.instruments:
+                continue
+            if market.get("mark_price"):
+                self.update_mark(instrument_id, market["mark_price"])
+            channels.add(
+                f"markprice:{market['underlying_asset']}:{market['instrument_type']}"
+            )
+        channels.difference_update(self.client.subscriptions)
+        if channels:
+            await self.client.subscribe(sorted(channels))
+
+        missing = self.missing_marks()
+        if missing:
+            logger.warning(f"No mark price for instruments {sorted(missing)}")
+        return missing
+
+    def refresh(self, account=None, portfolio=None):
+        """Reload available margin, dropping reservations of orders sent so far."""
+        if account is None:
+            account = self.client.rest_get_account()
+        available = account.get("available_balance")
+        if available is None:
+            if portfolio is None:
+                portfolio = self.client.rest_get_portfolio()
+            margin = portfolio.get("user_margin") or {}
+            if margin.get("balance") is not None:
+                available = float(margin["balance"]) - float(margin.get("used") or 0)
+            else:
+                available = portfolio.get("balance")
+        if available is None:
+            logger.error(f"Cannot read available margin: {account} {portfolio}")
+            return False
+
+        with self._lock:
+            self.available_margin = float(available)
+            self.reserved = 0.0
+            self.refreshed_at = time.time()
+        return True
+
+    async def refresh_async(self):
+        loop = asyncio.get_running_loop()
+        account = await loop.run_in_executor(None, self.client.rest_get_account)
+        portfolio = None
+        if account.get("available_balance") is None:
+            portfolio = await loop.run_in_executor(None, self.client.rest_get_portfolio)
+        return self.refresh(account, portfolio)
+
+    async def run(self):
+        while True:
+            try:
+                await self.refresh_async()
+            except Exception as e:
+                logger.error("Error thrown when refreshing available margin")
+                logger.error(e)
+            try:
+                if self.missing_marks():
+                    await self.watch_marks()
+            except Exception as e:
+                logger.error("Error thrown when loading mark prices")
+                logger.error(e)
+            await asyncio.sleep(self.refresh_interval)
+
+    def stats(self):
+        return {
+            "available_margin": self.available_margin,
+            "reserved": self.reserved,
+            "refreshed_at": self.refreshed_at,
+            "rejected": dict(self.rejected),
+        }
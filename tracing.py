@@ -0,0 +1,190 @@
+import contextvars
+import itertools
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+
+# Stages in the order a signal normally goes through them
+STAGES = (
+    "receive",
+    "parse",
+    "dequeue",
+    "risk",
+    "sign",
+    "serialize",
+    "send",
+    "ack",
+    "fill",
+)
+
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+class Trace:
+    def __init__(self, tracer, id, name):
+        self.tracer = tracer
+        self.id = id
+        self.name = name
+        self.marks = []  # (stage, perf_counter seconds)
+        self.order_ids = []
+
+    def mark(self, stage):
+        self.marks.append((stage, time.perf_counter()))
+
+    def has(self, stage):
+        return any(name == stage for name, _ in self.marks)
+
+    def bind(self, order_id):
+        self.order_ids.append(order_id)
+        self.tracer._bind(order_id, self)
+
+    def as_dict(self):
+        start = self.marks[0][1] if self.marks else 0.0
+        return {
+            "id": self.id,
+            "name": self.name,
+            "order_ids": self.order_ids,
+            "marks": [(stage, (t - start) * 1000) for stage, t in self.marks],
+        }
+
+
+class TraceGroup:
+    """Traces of several signals served by one order, e.g. netted signals.
+
+    Stands in for a trace in the context, every stage and the order are
+    recorded on each member.
+    """
+
+    def __init__(self, traces):
+        self.traces = traces
+        self.tracer = traces[0].tracer
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        for trace in self.traces:
+            trace.marks.append((stage, now))
+
+    def has(self, stage):
+        return all(trace.has(stage) for trace in self.traces)
+
+    def bind(self, order_id):
+        for trace in self.traces:
+            trace.order_ids.append(order_id)
+        self.tracer._bind(order_id, self)
+
+
+def group(traces):
+    """One trace standing for ``traces``, None without any."""
+    traces = [trace for trace in traces if trace is not None]
+    if len(traces) > 1:
+        return TraceGroup(traces)
+    return traces[0] if traces else None
+
+
+def mark(stage):
+    """Timestamp ``stage`` on the trace of the current context, if any."""
+    trace = current_trace.get()
+    if trace is not None:
+        trace.mark(stage)
+
+
+def bind_order(order_id):
+    """Attach an order to the current trace so its ack and fill can be matched."""
+    trace = current_trace.get()
+    if trace is not None:
+        trace.bind(order_id)
+
+
+def percentile(values, q):
+    index = min(len(values) - 1, max(0, int(round(q / 100 * (len(values) - 1)))))
+    return values[index]
+
+
+class Tracer:
+    """Fixed-size ring buffer of signal traces with per-stage percentiles.
+
+    A trace is started per signal and travels with the context, so stages
+    marked deep in the client (risk check, signing, send, ack) land on the
+    signal that caused them. Fills are matched to traces by order id.
+    """
+
+    def __init__(self, size=10000):
+        self.traces = deque(maxlen=size)
+        self.by_order = OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def start(self, name):
+        trace = Trace(self, next(self._ids), name)
+        trace.mark("receive")
+        with self._lock:
+            self.traces.append(trace)
+        current_trace.set(trace)
+        return trace
+
+    def _bind(self, order_id, trace):
+        with self._lock:
+            self.by_order[order_id] = trace
+            while len(self.by_order) > self.traces.maxlen:
+                self.by_order.popitem(last=False)
+
+    def handle(self, message):
+        if not isinstance(message, dict):
+            # Cheap check before decoding, only fills are of interest
+            if '"fills"' not in message:
+                return
+            message = json.loads(message)
+
+        if message.get("channel") != "fills":
+            return
+        fill = (message.get("data") or {}).get("fill") or {}
+        trace = self.by_order.get(fill.get("order_id"))
+        if trace is not None and not trace.has("fill"):
+            trace.mark("fill")
+
+    def percentiles(self, name=None):
+        """Per stage latency in ms since the previous stage and since receive."""
+        since_previous = {}
+        since_receive = {}
+        with self._lock:
+            traces = [t for t in self.traces if name is None or t.name == name]
+
+        for trace in traces:
+            marks = sorted(trace.marks, key=lambda m: m[1])
+            if not marks:
+                continue
+            start = marks[0][1]
+            previous = start
+            for stage, t in marks[1:]:
+                since_previous.setdefault(stage, []).append((t - previous) * 1000)
+                since_receive.setdefault(stage, []).append((t - start) * 1000)
+                previous = t
+
+        def summary(values):
+            values.sort()
+            return {
+                "count": len(values),
+                "p50": percentile(values, 50),
+                "p90": percentile(values, 90),
+                "p99": percentile(values, 99),
+                "max": values[-1],
+            }
+
+        ordered = [s for s in STAGES if s in since_previous] + sorted(
+            s for s in since_previous if s not in STAGES
+        )
+        return {
+            "traces": len(traces),
+            "stages": {
+                stage: {
+                    "since_previous": summary(since_previous[stage]),
+                    "since_receive": summary(since_receive[stage]),
+                }
+                for stage in ordered
+            },
+        }
+
+    def recent(self, count=20):
+        with self._lock:
+            return [trace.as_dict() for trace in list(self.traces)[-count:]]
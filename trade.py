@@ -49,22 +49,29 @@
 """
 
 import asyncio
+import functools
+import hmac
 import sys
+import threading
 import traceback
 
 from loguru import logger
 from aevo import AevoClient
-from web3 import Web3
+from accounts import AccountPool
+from clocksync import ClockSync
+from positions import PositionTracker
+from netting import SignalNetter
+from profiler import SamplingProfiler
+from risk import PreTradeRisk
+import metrics
+import tracing
+from webhooks import WebhookQueue
 from flask import Flask, request, jsonify
 import keys  # Импортируем файл конфигурации
-import requests
 
 # Настройка логирования
 logger.add("app.log", rotation="10 MB", level="DEBUG")
 
-# Генерация ключа (можно удалить, если он не нужен)
-signing_key = Web3.solidity_keccak(['string'], ['my random string']).hex()
-
 # Создание клиента Aevo с использованием значений из config.py
 aevo = AevoClient(
     signing_key=keys.signing_key,
@@ -72,6 +79,9 @@ aevo = AevoClient(
     api_key=keys.api_key,
     api_secret=keys.api_secret,
     env="testnet",
+    # Адреса локальной биржи-заглушки (mock_exchange.py), если заданы
+    rest_url=getattr(keys, "rest_url", None),
+    ws_url=getattr(keys, "ws_url", None),
 )
 
 # Проверка наличия ключа подписи
@@ -79,110 +89,342 @@ if not aevo.signing_key:
     logger.error("Signing key is not set. Please set the signing key in the AevoClient constructor.")
     sys.exit("Signing key is not set")
 
+# Позиции и баланс в памяти: обновляются по fills и ценам, сверяются с REST
+tracker = PositionTracker(
+    aevo,
+    max_staleness=getattr(keys, "positions_max_staleness", 60.0),
+    reconcile_interval=getattr(keys, "positions_reconcile_interval", 30.0),
+)
+
+# Часы биржи: смещение оценивается по REST-ответам и fills, время ордеров берется из них
+clock = ClockSync(aevo, sync_interval=getattr(keys, "clock_sync_interval", 60.0))
+
+# Локальная проверка ордеров до подписи: маржа, размер, ценовой коридор
+# Mark price торгуемого инструмента нужен для оценки рыночных ордеров.
+# Ордера аккаунтов из keys.accounts через эту проверку не проходят
+risk = PreTradeRisk(
+    aevo,
+    positions=tracker,
+    instruments=[getattr(keys, "instrument_id", None)],
+    **getattr(keys, "risk_limits", {})
+)
+
+# Дополнительные аккаунты из keys.accounts: {имя: {signing_key, wallet_address,
+# api_key, api_secret, instrument_id, quantity, rate, burst}}. Клиент создается
+# при первом сигнале и закрывается после простоя. Аккаунт из keys.py - "default".
+DEFAULT_ACCOUNT = "default"
+accounts = AccountPool(
+    getattr(keys, "accounts", {}),
+    rate=getattr(keys, "account_rate", 10.0),
+    burst=getattr(keys, "account_burst", 20),
+    idle_timeout=getattr(keys, "account_idle_timeout", 900.0),
+    clock=clock,
+)
+accounts.register(DEFAULT_ACCOUNT, aevo)
+
+
+async def stream_positions():
+    """
+    Поддерживает PositionTracker в актуальном состоянии через websocket.
+    """
+    await aevo.open_connection()
+    await aevo.subscribe_fills()
+    await tracker.reconcile_async()
+    asyncio.create_task(tracker.run())
+    asyncio.create_task(risk.run())
+    asyncio.create_task(accounts.run())
+    asyncio.create_task(clock.run(next(iter(getattr(keys, "assets", ())), "ETH")))
+
+    async for message in aevo.read_messages():
+        tracer.handle(message)
+        clock.handle(message)
+        tracker.handle(message)
+        risk.handle(message)
+        if tracker.marks_pending:
+            # Новая позиция: подписываемся на ее mark price и индекс
+            await tracker.subscribe_marks()
+
+
+# Один event loop на весь процесс: websocket, REST-сессия и обработчики запросов
+loop = asyncio.new_event_loop()
+loop_thread = None
+loop_lock = threading.Lock()
+
+
+def start_loop():
+    """
+    Запускает общий event loop в фоновом потоке (один раз).
+    """
+    global loop_thread
+    with loop_lock:
+        if loop_thread is None:
+            loop_thread = threading.Thread(
+                target=loop.run_forever, name="aevo-loop", daemon=True
+            )
+            loop_thread.start()
+    return loop
+
+
+# Трассировка сигналов: от получения запроса до подтверждения и исполнения
+tracer = tracing.Tracer(size=getattr(keys, "trace_buffer_size", 10000))
+
+# Сигналы ставятся в очередь и исполняются пулом воркеров в общем event loop
+webhooks = WebhookQueue(
+    loop,
+    workers=getattr(keys, "webhook_workers", 4),
+    ttl=getattr(keys, "webhook_idempotency_ttl", 300.0),
+    retry_ttl=getattr(keys, "webhook_retry_ttl", 5.0),
+)
+
+# Метрики процесса, читаются в момент запроса /metrics
+metrics.REGISTRY.gauge(
+    "trade_webhook_queue_depth", "Signals waiting for a webhook worker"
+).set_function(webhooks.pending)
+metrics.REGISTRY.gauge(
+    "trade_accounts_active", "Accounts with a client in the pool"
+).set_function(lambda: len(accounts.handles))
+metrics.REGISTRY.gauge(
+    "aevo_clock_offset_seconds", "Exchange clock minus the local clock"
+).set_function(lambda: clock.offset)
+metrics.REGISTRY.gauge(
+    "aevo_clock_uncertainty_seconds", "Error bound of the clock offset"
+).set_function(lambda: clock.uncertainty)
+metrics.REGISTRY.gauge(
+    "aevo_ws_connected", "Whether the websocket of the default account is open"
+).set_function(lambda: bool(aevo.connection and aevo.connection.open))
+
+
+def resolve_account(account=None):
+    """
+    Аккаунт сигнала: из пути /<account>/..., из поля account или по умолчанию.
+    """
+    data = request.get_json(silent=True) or {}
+    return accounts.get(account or data.get("account") or DEFAULT_ACCOUNT)
+
+
+def setting(handle, name):
+    """
+    Настройка аккаунта (instrument_id, quantity) или значение из keys.py.
+    """
+    return handle.settings.get(name, getattr(keys, name))
+
 
-async def buy_market(instrument_id, quantity):
+def enqueue_signal(endpoint, handle, instrument_id, job, pinned=True):
+    """
+    Ставит сигнал в очередь и сразу отвечает, повторные доставки отбрасываются.
+
+    Ключ идемпотентности берется из заголовка Idempotency-Key или поля
+    idempotency_key, иначе из поля доставки (alert_id, id, timestamp, time).
+    Без них тело запроса отсекает только повторы за несколько секунд
+    (webhook_retry_ttl), одинаковые сигналы подряд исполняются. Ключ и статистика
+    ведутся по аккаунту и эндпоинту (/sub1/long), одинаковые сигналы разных
+    аккаунтов не считаются повтором. Перед исполнением сигнал ждет свободного
+    места в лимите запросов аккаунта - у каждого аккаунта свои воркеры, ожидание
+    лимита одного аккаунта не задерживает сигналы других.
+    """
+    start_loop()
+    endpoint = f"/{handle.name}{endpoint}"
+    data = request.get_json(silent=True) or {}
+    tracing.mark("parse")
+    key = request.headers.get("Idempotency-Key") or data.get("idempotency_key")
+    trace = tracing.current_trace.get()
+
+    async def traced():
+        # Задачи воркеров не наследуют контекст HTTP-потока
+        token = tracing.current_trace.set(trace)
+        try:
+            tracing.mark("dequeue")
+            await handle.bucket.acquire()
+            return await job()
+        finally:
+            tracing.current_trace.reset(token)
+
+    accepted, key = webhooks.submit(
+        endpoint,
+        f"{handle.name}:{instrument_id}",
+        traced,
+        key=key,
+        body=data or request.get_data(),
+        pinned=pinned,
+        account=handle.name,
+    )
+    # По id трассы loadgen.py находит ордера сигнала в /debug/latency
+    response = {"key": key, "trace": trace.id if trace is not None else None}
+    if not accepted:
+        return jsonify(dict(response, status="duplicate")), 200
+    return jsonify(dict(response, status="queued")), 202
+
+
+def start_position_stream():
+    def done(future):
+        if not future.cancelled() and future.exception():
+            logger.error(f"Position stream stopped: {future.exception()}")
+
+    future = asyncio.run_coroutine_threadsafe(stream_positions(), start_loop())
+    future.add_done_callback(done)
+    return future
+
+
+def order_error(response):
+    """
+    Результат задачи с ошибкой, если биржа или pre-trade risk отклонили ордер.
+    Такой результат очередь считает неудачей и освобождает ключ идемпотентности.
+    """
+    if isinstance(response, dict) and response.get("error"):
+        return {"status": "error", "message": f"Error: {response['error']}"}
+    return None
+
+
+async def buy_market(instrument_id, quantity, client=aevo):
     """
     Создает рыночный ордер на покупку.
 
     Аргументы:
     instrument_id: Идентификатор инструмента.
     quantity: Количество для покупки.
+    client: Клиент аккаунта.
 
     Возвращает:
     Словарь с сообщением о результате выполнения.
     """
     try:
         logger.info("Creating market buy order...")
-        response = aevo.rest_create_market_order(
+        response = await client.rest_create_market_order_async(
             instrument_id=instrument_id,
             is_buy=True,
             quantity=quantity,
         )
-        logger.info("Market buy order request sent successfully")
         logger.info("Response: {}".format(response))
+        if order_error(response):
+            logger.error(f"Market buy order rejected: {response['error']}")
+            return order_error(response)
+        logger.info("Market buy order request sent successfully")
         return {"message": "Buy order executed successfully"}
     except Exception as e:
         logger.exception("An error occurred while creating market buy order: {}", e)
-        return {"message": f"Error: {e}"}
+        return {"status": "error", "message": f"Error: {e}"}
 
 
-async def sell_market(instrument_id, quantity):
+async def sell_market(instrument_id, quantity, client=aevo):
     """
     Создает рыночный ордер на продажу.
 
     Аргументы:
     instrument_id: Идентификатор инструмента.
     quantity: Количество для продажи.
+    client: Клиент аккаунта.
 
     Возвращает:
     Словарь с сообщением о результате выполнения.
     """
     try:
         logger.info("Creating market sell order...")
-        response = aevo.rest_create_market_order(
+        response = await client.rest_create_market_order_async(
             instrument_id=instrument_id,
             is_buy=False,
             quantity=quantity,
 
         )
-        logger.info("Market sell order request sent successfully")
         logger.info("Response: {}".format(response))
+        if order_error(response):
+            logger.error(f"Market sell order rejected: {response['error']}")
+            return order_error(response)
+        logger.info("Market sell order request sent successfully")
         return {"message": "Sell order executed successfully"}
     except Exception as e:
         logger.exception("An error occurred while creating market sell order: {}", e)
-        return {"message": f"Error: {e}"}
+        return {"status": "error", "message": f"Error: {e}"}
 
 
-async def close_positions():
+async def execute_net_order(target, is_buy, quantity):
     """
-    Закрывает все открытые позиции.
-
-    Возвращает:
-    Словарь с сообщением о результате выполнения.
+    Исполняет итоговый рыночный ордер окна неттинга, target - (аккаунт, инструмент).
     """
-    try:
-        logger.info("Fetching open positions...")
+    account, instrument_id = target
+    handle = accounts.get(account)
+    if is_buy:
+        return await buy_market(instrument_id, quantity, handle.client)
+    return await sell_market(instrument_id, quantity, handle.client)
 
-        url = "https://api.aevo.xyz/positions"
-        headers = {
-            "accept": "application/json",
-            "AEVO-KEY": keys.api_key,
-            "AEVO-SECRET": keys.api_secret
-        }
 
-        response = requests.get(url, headers=headers)
+# Неттинг рыночных сигналов: за окно в netting_window_ms (0 - выключен)
+# встречные /long и /short сворачиваются в один ордер или ни одного
+netting_window = getattr(keys, "netting_window_ms", 0) / 1000
+netter = SignalNetter(execute_net_order, netting_window)
 
-        if response.status_code == 200:
-            positions = response.json().get("positions", [])
-            if not positions:
-                logger.info("No open positions found.")
-                return {"status": "success", "message": "No open positions found."}
 
-            logger.info(f"Found {len(positions)} open positions.")
+def market_signal(endpoint, handle, is_buy, quantity):
+    """
+    Ставит рыночный сигнал в очередь, через окно неттинга, если оно включено.
+    """
+    instrument_id = setting(handle, "instrument_id")
+    if netting_window:
+        target = (handle.name, instrument_id)
+        job = functools.partial(netter.submit, target, is_buy, quantity)
+        return enqueue_signal(endpoint, handle, instrument_id, job, pinned=False)
 
-            for position in positions:
-                logger.info(f"Open position: {position}")
+    execute = buy_market if is_buy else sell_market
+    job = functools.partial(execute, instrument_id, quantity, handle.client)
+    return enqueue_signal(endpoint, handle, instrument_id, job)
 
-                instrument_id = position.get("instrument_id")
-                is_buy = position.get("side") == "buy"
 
-                # Создать рыночный ордер для закрытия позиции
-                try:
-                    result = aevo.rest_create_market_order(
-                        instrument_id=instrument_id,
-                        is_buy=not is_buy,  # Противоположная сторона для закрытия позиции
-                        quantity=keys.quantity,
-                    )
-                    logger.info(f"Closed position: {position}")
-                    logger.info(f"Result: {result}")
-                except Exception as e:
-                    logger.error(f"Failed to close position: {position}")
-                    logger.error(f"Error: {e}")
+async def close_positions(handle=None):
+    """
+    Закрывает все открытые позиции аккаунта.
+
+    Возвращает:
+    Словарь с сообщением о результате выполнения.
+    """
+    try:
+        logger.info("Fetching open positions...")
 
-            return {"status": "success", "message": "Closed all open positions successfully."}
+        if handle is None or handle.client is aevo:
+            # Может обратиться к REST, если данные устарели
+            positions = await asyncio.get_running_loop().run_in_executor(
+                None, tracker.get_positions
+            )
+            client, quantity = aevo, keys.quantity
         else:
-            logger.error(f"Failed to fetch positions. Status code: {response.status_code}")
-            return {"status": "error", "message": f"Failed to fetch positions. Status code: {response.status_code}"}
+            response = await handle.client.rest_get_positions_async()
+            if not isinstance(response, dict) or response.get("error"):
+                logger.error(f"Failed to fetch positions: {response}")
+                return {"status": "error", "message": f"Failed to fetch positions: {response}"}
+            positions = response.get("positions", [])
+            client, quantity = handle.client, setting(handle, "quantity")
+        if not positions:
+            logger.info("No open positions found.")
+            return {"status": "success", "message": "No open positions found."}
+
+        logger.info(f"Found {len(positions)} open positions.")
+
+        failed = 0
+        for position in positions:
+            logger.info(f"Open position: {position}")
+
+            instrument_id = position.get("instrument_id")
+            is_buy = position.get("side") == "buy"
+
+            # Создать рыночный ордер для закрытия позиции
+            try:
+                result = await client.rest_create_market_order_async(
+                    instrument_id=instrument_id,
+                    is_buy=not is_buy,  # Противоположная сторона для закрытия позиции
+                    quantity=quantity,
+                )
+                logger.info(f"Result: {result}")
+                if order_error(result):
+                    failed += 1
+                    logger.error(f"Failed to close position: {position}")
+                else:
+                    logger.info(f"Closed position: {position}")
+            except Exception as e:
+                failed += 1
+                logger.error(f"Failed to close position: {position}")
+                logger.error(f"Error: {e}")
+
+        if failed:
+            return {"status": "error", "message": f"Failed to close {failed} of {len(positions)} positions."}
+        return {"status": "success", "message": "Closed all open positions successfully."}
 
     except Exception as e:
         logger.error(f"Error fetching positions: {e}")
@@ -190,7 +432,7 @@ async def close_positions():
         return {"status": "error", "message": f"Failed to fetch positions: {str(e)}"}
 
 
-async def buy_limit(instrument_id, quantity, limit_price):
+async def buy_limit(instrument_id, quantity, limit_price, client=aevo):
     """
     Создает лимитный ордер на покупку.
 
@@ -198,28 +440,32 @@ async def buy_limit(instrument_id, quantity, limit_price):
     - instrument_id (str): Идентификатор инструмента.
     - quantity (float): Количество для покупки.
     - limit_price (float): Цена лимита.
+    - client (AevoClient): Клиент аккаунта.
 
     Возвращает:
     Словарь с результатом выполнения операции.
     """
     try:
         logger.info("Creating limit buy order...")
-        response = aevo.rest_create_order(
+        response = await client.rest_create_order_async(
             instrument_id=instrument_id,
             is_buy=True,
             limit_price=limit_price,
             quantity=quantity,
             post_only=False,
         )
-        logger.info("Limit buy order request sent successfully")
         logger.info("Response: {}".format(response))
+        if order_error(response):
+            logger.error(f"Limit buy order rejected: {response['error']}")
+            return order_error(response)
+        logger.info("Limit buy order request sent successfully")
         return {"message": "Limit buy order executed successfully"}
     except Exception as e:
         logger.exception("An error occurred while creating limit buy order: {}", e)
-        return {"message": f"Error: {e}"}
+        return {"status": "error", "message": f"Error: {e}"}
 
 
-async def sell_limit(instrument_id, quantity, limit_price):
+async def sell_limit(instrument_id, quantity, limit_price, client=aevo):
     """
     Создает лимитный ордер на продажу.
 
@@ -227,133 +473,243 @@ async def sell_limit(instrument_id, quantity, limit_price):
     - instrument_id (str): Идентификатор инструмента.
     - quantity (float): Количество для продажи.
     - limit_price (float): Цена лимита.
+    - client (AevoClient): Клиент аккаунта.
 
     Возвращает:
     Словарь с результатом выполнения операции.
     """
     try:
         logger.info("Creating limit sell order...")
-        response = aevo.rest_create_order(
+        response = await client.rest_create_order_async(
             instrument_id=instrument_id,
             is_buy=False,
             limit_price=limit_price,
             quantity=quantity,
             post_only=False,
         )
-        logger.info("Limit sell order request sent successfully")
         logger.info("Response: {}".format(response))
+        if order_error(response):
+            logger.error(f"Limit sell order rejected: {response['error']}")
+            return order_error(response)
+        logger.info("Limit sell order request sent successfully")
         return {"message": "Limit sell order executed successfully"}
     except Exception as e:
         logger.exception("An error occurred while creating limit sell order: {}", e)
-        return {"message": f"Error: {e}"}
+        return {"status": "error", "message": f"Error: {e}"}
 
 
 app = Flask(__name__)
 
 
+@app.before_request
+def start_trace():
+    if request.method == 'POST':
+        tracer.start(request.path)
+
+
 @app.route('/long', methods=['POST'])
-def buy():
+@app.route('/<account>/long', methods=['POST'])
+def buy(account=None):
+    handle = resolve_account(account)
+    if handle is None:
+        return jsonify({"error": "Unknown account"}), 404
     data = request.json
     quan = data.get('quantity')
     print(quan)
     print(type(quan))
     print(keys.quantity)
     print(type(keys.quantity))
-    result = asyncio.run(buy_market(keys.instrument_id, quan))
-    return jsonify(result)
+    return market_signal("/long", handle, True, quan)
 
 
 @app.route('/short', methods=['POST'])
-def sell():
+@app.route('/<account>/short', methods=['POST'])
+def sell(account=None):
+    handle = resolve_account(account)
+    if handle is None:
+        return jsonify({"error": "Unknown account"}), 404
     data = request.json
     quan = data.get('quantity')
     print(quan)
     print(type(quan))
     print(keys.quantity)
     print(type(keys.quantity))
-    result = asyncio.run(sell_market(keys.instrument_id, quan))
-    return jsonify(result)
+    return market_signal("/short", handle, False, quan)
 
 
 @app.route('/sell_all', methods=['POST'])
-def close():
-    result = asyncio.run(close_positions())
-    return jsonify(result)
+@app.route('/<account>/sell_all', methods=['POST'])
+def close(account=None):
+    handle = resolve_account(account)
+    if handle is None:
+        return jsonify({"error": "Unknown account"}), 404
+    # Закрытие всех позиций упорядочено вместе с сигналами основного инструмента
+    instrument_id = setting(handle, "instrument_id")
+    job = functools.partial(close_positions, handle)
+    return enqueue_signal("/sell_all", handle, instrument_id, job)
 
 
 @app.route('/long_limit', methods=['POST'])
-def buy_limit_route():
+@app.route('/<account>/long_limit', methods=['POST'])
+def buy_limit_route(account=None):
+    handle = resolve_account(account)
+    if handle is None:
+        return jsonify({"error": "Unknown account"}), 404
     data = request.json
-    instrument_id = data.get("instrument_id", keys.instrument_id)
-    quantity = data.get("quantity", keys.quantity)
+    instrument_id = data.get("instrument_id", setting(handle, "instrument_id"))
+    quantity = data.get("quantity", setting(handle, "quantity"))
     limit_price = data.get("limit_price")
     if limit_price is None:
         return jsonify({"error": "Limit price is required"}), 400
-    result = asyncio.run(buy_limit(instrument_id, quantity, limit_price))
-    return jsonify(result)
+    return enqueue_signal(
+        "/long_limit",
+        handle,
+        instrument_id,
+        functools.partial(buy_limit, instrument_id, quantity, limit_price, handle.client),
+    )
 
 
 @app.route('/short_limit', methods=['POST'])
-def sell_limit_route():
+@app.route('/<account>/short_limit', methods=['POST'])
+def sell_limit_route(account=None):
+    handle = resolve_account(account)
+    if handle is None:
+        return jsonify({"error": "Unknown account"}), 404
     data = request.json
-    instrument_id = data.get("instrument_id", keys.instrument_id)
-    quantity = data.get("quantity", keys.quantity)
+    instrument_id = data.get("instrument_id", setting(handle, "instrument_id"))
+    quantity = data.get("quantity", setting(handle, "quantity"))
     limit_price = data.get("limit_price")
     if limit_price is None:
         return jsonify({"error": "Limit price is required"}), 400
-    result = asyncio.run(sell_limit(instrument_id, quantity, limit_price))
+    return enqueue_signal(
+        "/short_limit",
+        handle,
+        instrument_id,
+        functools.partial(sell_limit, instrument_id, quantity, limit_price, handle.client),
+    )
+
+
+@app.route('/webhook_stats', methods=['GET'])
+def webhook_stats():
+    """
+    Глубина очереди, время ожидания и исполнения сигналов по аккаунту и эндпоинту.
+    """
+    return jsonify(webhooks.snapshot())
+
+
+@app.route('/accounts', methods=['GET'])
+def accounts_stats():
+    """
+    Активные аккаунты, их лимиты запросов и время простоя.
+    """
+    return jsonify(accounts.stats())
+
+
+@app.route('/debug/latency', methods=['GET'])
+def debug_latency():
+    """
+    Перцентили задержек по стадиям (мс), ?endpoint=/long для одного эндпоинта,
+    ?recent=N добавляет последние N трасс.
+    """
+    result = tracer.percentiles(request.args.get('endpoint'))
+    recent = request.args.get('recent', type=int)
+    if recent:
+        result["recent"] = tracer.recent(recent)
     return jsonify(result)
 
 
+# Профайлер включается только на время запроса /debug/profile
+profiler = SamplingProfiler(interval=getattr(keys, "profile_interval", 0.005))
+
+
+@app.route('/debug/profile', methods=['GET', 'POST'])
+def debug_profile():
+    """
+    Снимает стеки всех потоков (Flask и event loop) в течение ?seconds=N
+    (по умолчанию 10, не больше 120) и возвращает их в формате collapsed
+    для flamegraph.pl/speedscope, ?format=json - самые частые функции
+    (без ожидающих потоков, ?idle=1 - с ними).
+    Доступен только с заголовком X-Debug-Token, равным keys.debug_token.
+    """
+    token = getattr(keys, "debug_token", None)
+    supplied = request.headers.get('X-Debug-Token', '')
+    if not token or not hmac.compare_digest(supplied.encode(), token.encode()):
+        return jsonify({"error": "Not found"}), 404
+
+    seconds = min(max(request.args.get('seconds', 10.0, type=float), 0.1), 120.0)
+    # Результат этого запуска, следующий запуск его не перезапишет
+    profile = profiler.run(seconds)
+    if profile is None:
+        return jsonify({"error": "Profile already running"}), 409
+
+    if request.args.get('format') == 'json':
+        return jsonify({
+            "samples": profile.samples,
+            "interval": profile.interval,
+            "seconds": profile.seconds,
+            "top": profile.top(
+                request.args.get('top', 20, type=int),
+                include_idle=request.args.get('idle') == '1',
+            ),
+        })
+    return profile.collapsed(), 200, {'Content-Type': 'text/plain; charset=utf-8'}
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """
+    Метрики в текстовом формате Prometheus: ордера, ответы биржи, websocket,
+    очереди и время подписи.
+    """
+    return metrics.REGISTRY.expose(), 200, {'Content-Type': metrics.CONTENT_TYPE}
+
+
 @app.route('/money_account', methods=['GET'])
 def money_account():
-    url = "https://api.aevo.xyz/portfolio"
-
-    headers = {
-        "accept": "application/json",
-        "AEVO-KEY": keys.api_key,
-        "AEVO-SECRET": keys.api_secret
-    }
+    """
+    Получает баланс счета из PositionTracker.
 
-    response = requests.get(url, headers=headers)
+    Возвращает:
+    JSON-ответ с балансом или сообщением об ошибке.
+    """
+    try:
+        balance = tracker.get_balance()
+    except Exception as e:
+        logger.error(f"Error fetching balance: {e}")
+        return jsonify({"error": f"Failed to fetch balance: {e}"}), 500
 
-    if response.status_code == 200:
-        data = response.json()
-        balance = data.get("balance")
-        if balance:
-            return jsonify({"balance": balance})
-        else:
-            return jsonify({"error": "Balance not found in response"}), 500
+    if balance:
+        return jsonify({"balance": balance})
     else:
-        return jsonify({"error": f"Request failed with status code: {response.status_code}"}), 500
+        return jsonify({"error": "Balance not found in response"}), 500
 
 
 @app.route('/positions', methods=['GET'])
 def get_positions():
     """
-    Получает открытые позиции через веб-сервис.
+    Получает открытые позиции из PositionTracker.
 
     Возвращает:
     JSON-ответ с открытыми позициями или сообщением об ошибке.
     """
-    url = "https://api.aevo.xyz/positions"
-
-    headers = {
-        "accept": "application/json",
-        "AEVO-KEY": keys.api_key,
-        "AEVO-SECRET": keys.api_secret
-    }
-
-    response = requests.get(url, headers=headers)
+    try:
+        positions = tracker.get_positions()
+    except Exception as e:
+        logger.error(f"Error fetching positions: {e}")
+        return jsonify({"error": f"Failed to fetch positions: {e}"}), 500
 
-    if response.status_code == 200:
-        data = response.json()
-        positions = data.get("positions", [])
-        with app.app_context():
-            return jsonify({"positions": positions})
-    else:
-        return jsonify({"error": f"Request failed with status code: {response.status_code}"}), 500
+    return jsonify({"positions": positions})
 
 
 if __name__ == '__main__':
+    # Быстрый старт: тяжелые модули подписи и сети грузятся в фоне, пока
+    # сервер уже принимает запросы. fast_start = False в keys.py - грузить сразу
+    if getattr(keys, "fast_start", True):
+        threading.Thread(target=aevo.warmup, name="warmup", daemon=True).start()
+    else:
+        aevo.warmup()
+    # Шаг цены и лота инструментов для округления ордеров
+    for asset in getattr(keys, "assets", ()):
+        aevo.load_markets(asset)
+    start_position_stream()
     app.run(host='0.0.0.0', port=5001)
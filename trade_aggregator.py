@@ -0,0 +1,205 @@
+import json
+import math
+
+import numpy as np
+
+NS = 10**9
+
+BAR_FIELDS = ("open", "high", "low", "close", "volume", "turnover", "trades")
+
+
+class BarSeries:
+    """Fixed-size ring buffer of OHLCV bars at one resolution."""
+
+    def __init__(self, resolution, length=1440):
+        self.resolution = resolution
+        self.resolution_ns = int(resolution * NS)
+        self.length = length
+        self.start = np.zeros(length, dtype=np.int64)
+        self.columns = {field: np.zeros(length) for field in BAR_FIELDS}
+        self.current = -1
+        self.count = 0
+        self._current_start = None
+
+    def update(self, timestamp, price, amount):
+        start = timestamp - timestamp % self.resolution_ns
+        columns = self.columns
+        late = self._current_start is not None and start < self._current_start
+        if not late and start != self._current_start:
+            self.current = (self.current + 1) % self.length
+            self.count = min(self.count + 1, self.length)
+            self._current_start = start
+            i = self.current
+            self.start[i] = start
+            columns["open"][i] = columns["high"][i] = columns["low"][i] = price
+            columns["close"][i] = price
+            columns["volume"][i] = amount
+            columns["turnover"][i] = price * amount
+            columns["trades"][i] = 1
+            return
+
+        # A trade older than the current bar is folded into it, its own bar
+        # is closed and the close stays the latest trade's
+        i = self.current
+        if price > columns["high"][i]:
+            columns["high"][i] = price
+        if price < columns["low"][i]:
+            columns["low"][i] = price
+        if not late:
+            columns["close"][i] = price
+        columns["volume"][i] += amount
+        columns["turnover"][i] += price * amount
+        columns["trades"][i] += 1
+
+    def _order(self, n):
+        n = self.count if n is None else min(n, self.count)
+        return (np.arange(self.current - n + 1, self.current + 1)) % self.length
+
+    def bars(self, n=None):
+        """Last ``n`` bars oldest first, as ``start`` plus one array per field."""
+        order = self._order(n)
+        bars = {field: column[order] for field, column in self.columns.items()}
+        bars["start"] = self.start[order]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            bars["vwap"] = bars["turnover"] / bars["volume"]
+        return bars
+
+    def last(self):
+        if self.count == 0:
+            return None
+        i = self.current
+        bar = {field: float(column[i]) for field, column in self.columns.items()}
+        bar["start"] = int(self.start[i])
+        return bar
+
+
+class TradeAggregator:
+    """Streaming OHLCV bars, session VWAP, EWMA volatility and volume profile.
+
+    Every trade of the instrument is folded in with O(1) work, bars live in
+    fixed-size ring buffers so memory does not grow with the session. The
+    volume profile keeps at most ``profile_levels`` price levels, the one
+    farthest from a new level's price is dropped to make room.
+    """
+
+    def __init__(
+        self,
+        instrument_name,
+        resolutions=(1, 60, 300),
+        length=1440,
+        ewma_halflife=100,
+        profile_tick=1.0,
+        profile_levels=2000,
+        session_length=86400,
+    ):
+        self.instrument_name = instrument_name
+        self.series = {
+            resolution: BarSeries(resolution, length) for resolution in resolutions
+        }
+        self.ewma_lambda = 0.5 ** (1 / ewma_halflife)
+        self.ewma_variance = 0.0
+        self.profile_tick = profile_tick
+        self.profile_levels = profile_levels
+        self.profile = {}
+        self.session_length = int(session_length * NS)
+        self.session_start = None
+        self.session_volume = 0.0
+        self.session_turnover = 0.0
+        self.last_price = None
+        self.last_timestamp = None
+        self.trades = 0
+
+    def add_trade(self, timestamp, price, amount):
+        session_start = timestamp - timestamp % self.session_length
+        # A late trade from the previous session does not restart it
+        if self.session_start is None or session_start > self.session_start:
+            self.session_start = session_start
+            self.session_volume = 0.0
+            self.session_turnover = 0.0
+            self.profile = {}
+
+        for series in self.series.values():
+            series.update(timestamp, price, amount)
+
+        self.session_volume += amount
+        self.session_turnover += price * amount
+
+        if self.last_price:
+            r = math.log(price / self.last_price)
+            lam = self.ewma_lambda
+            self.ewma_variance = lam * self.ewma_variance + (1 - lam) * r * r
+
+        bucket = round(price / self.profile_tick)
+        profile = self.profile
+        if bucket not in profile and len(profile) >= self.profile_levels:
+            lowest, highest = min(profile), max(profile)
+            del profile[lowest if bucket - lowest > highest - bucket else highest]
+        profile[bucket] = profile.get(bucket, 0.0) + amount
+
+        self.last_price = price
+        self.last_timestamp = timestamp
+        self.trades += 1
+
+    @property
+    def vwap(self):
+        if not self.session_volume:
+            return None
+        return self.session_turnover / self.session_volume
+
+    @property
+    def volatility(self):
+        """EWMA standard deviation of trade-to-trade log returns."""
+        return math.sqrt(self.ewma_variance)
+
+    def bars(self, resolution, n=None):
+        return self.series[resolution].bars(n)
+
+    def volume_profile(self):
+        """Session volume per price level, sorted by price."""
+        return sorted(
+            (bucket * self.profile_tick, volume)
+            for bucket, volume in self.profile.items()
+        )
+
+    def point_of_control(self):
+        if not self.profile:
+            return None
+        bucket = max(self.profile, key=self.profile.get)
+        return bucket * self.profile_tick
+
+
+class TradeAggregators:
+    """Routes ``trades:`` messages to a TradeAggregator per instrument."""
+
+    def __init__(self, **aggregator_kwargs):
+        self.aggregator_kwargs = aggregator_kwargs
+        self.aggregators = {}
+
+    def get(self, instrument_name):
+        return self.aggregators.get(instrument_name)
+
+    def handle(self, message):
+        if isinstance(message, (str, bytes)):
+            message = json.loads(message)
+
+        channel = message.get("channel") or ""
+        if not channel.startswith("trades:"):
+            return None
+
+        instrument_name = channel[len("trades:") :]
+        aggregator = self.aggregators.get(instrument_name)
+        if aggregator is None:
+            aggregator = self.aggregators[instrument_name] = TradeAggregator(
+                instrument_name, **self.aggregator_kwargs
+            )
+
+        trades = message.get("data") or ()
+        if isinstance(trades, dict):
+            trades = (trades,)
+        for trade in trades:
+            aggregator.add_trade(
+                int(trade["created_timestamp"]),
+                float(trade["price"]),
+                float(trade["amount"]),
+            )
+        return aggregator
@@ -0,0 +1,238 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from loguru import logger
+
+# Payload fields that identify one delivery of a signal, a repeated signal
+# with the same body but a new alert id or time is not a duplicate
+DELIVERY_FIELDS = ("alert_id", "id", "timestamp", "time")
+
+
+class IdempotencyCache:
+    """Keys seen during the last ``ttl`` seconds, at most ``max_keys`` of them."""
+
+    def __init__(self, ttl=300.0, max_keys=10000):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.keys = OrderedDict()  # key -> expiry, oldest first
+        self._lock = threading.Lock()
+
+    def add(self, key, ttl=None):
+        """Returns False when the key was already seen and has not expired."""
+        now = time.monotonic()
+        with self._lock:
+            while self.keys:
+                oldest, expiry = next(iter(self.keys.items()))
+                if expiry > now and len(self.keys) < self.max_keys:
+                    break
+                del self.keys[oldest]
+
+            # Keys with a shorter ttl may outlive it behind an older one
+            expiry = self.keys.pop(key, None)
+            if expiry is not None and expiry > now:
+                self.keys[key] = expiry
+                return False
+            self.keys[key] = now + (self.ttl if ttl is None else ttl)
+            return True
+
+    def discard(self, key):
+        with self._lock:
+            self.keys.pop(key, None)
+
+
+def delivery_id(body):
+    """Value of the first ``DELIVERY_FIELDS`` field of a JSON payload, or None."""
+    if isinstance(body, dict):
+        for field in DELIVERY_FIELDS:
+            if body.get(field) not in (None, ""):
+                return f"{field}={body[field]}"
+    return None
+
+
+def derive_key(endpoint, body):
+    if isinstance(body, dict):
+        body = json.dumps(body, sort_keys=True, default=str)
+    if isinstance(body, str):
+        body = body.encode()
+    return hashlib.sha256(endpoint.encode() + b"\0" + (body or b"")).hexdigest()
+
+
+def is_failure(result):
+    """Jobs fail by raising or by returning ``{"error": ...}`` or
+    ``{"status": "error"}``, also as the ``response`` of a netted signal."""
+    if not isinstance(result, dict):
+        return False
+    if result.get("error") or result.get("status") == "error":
+        return True
+    return is_failure(result.get("response"))
+
+
+class EndpointStats:
+    def __init__(self):
+        self.accepted = 0
+        self.duplicates = 0
+        self.executed = 0
+        self.failed = 0
+        self.depth = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.exec_total = 0.0
+        self.exec_max = 0.0
+
+    def as_dict(self):
+        done = self.executed + self.failed
+        return {
+            "accepted": self.accepted,
+            "duplicates": self.duplicates,
+            "executed": self.executed,
+            "failed": self.failed,
+            "depth": self.depth,
+            "wait_avg": self.wait_total / done if done else 0.0,
+            "wait_max": self.wait_max,
+            "exec_avg": self.exec_total / done if done else 0.0,
+            "exec_max": self.exec_max,
+        }
+
+
+class Signal:
+    def __init__(self, endpoint, instrument_id, job, key):
+        self.endpoint = endpoint
+        self.instrument_id = instrument_id
+        self.job = job
+        self.key = key
+        self.created_at = time.monotonic()
+
+
+class WebhookQueue:
+    """Signals accepted by the webhook routes and executed by a worker pool.
+
+    ``submit`` is called from the HTTP threads, drops deliveries whose
+    idempotency key was seen within the TTL and returns without waiting for
+    execution. The key is the client's one, else derived from a delivery
+    field of the payload (``DELIVERY_FIELDS``). A payload without either is
+    only deduplicated for ``retry_ttl`` seconds, enough to absorb the
+    provider's retries of one delivery but not to drop a repeated signal.
+    Every account gets its own ``workers`` workers on ``loop``, created with
+    its first signal, so an account waiting for its rate limit never holds up
+    another one. Each instrument is pinned to one worker of its account, so
+    signals of an instrument execute in arrival order while different
+    instruments proceed in parallel. A failed signal (see ``is_failure``)
+    releases its key so a retried delivery can run again.
+    """
+
+    def __init__(self, loop, workers=4, ttl=300.0, retry_ttl=5.0, max_keys=10000):
+        self.loop = loop
+        self.workers = workers
+        self.retry_ttl = retry_ttl
+        self.idempotency = IdempotencyCache(ttl, max_keys)
+        self.stats = {}
+        self.queues = {}  # account -> queues of its workers
+        self._tasks = []
+        self._lock = threading.Lock()
+
+    def pending(self):
+        """Signals waiting for a worker, over all accounts."""
+        return sum(
+            queue.qsize() for queues in list(self.queues.values()) for queue in queues
+        )
+
+    def _stats(self, endpoint):
+        stats = self.stats.get(endpoint)
+        if stats is None:
+            stats = self.stats[endpoint] = EndpointStats()
+        return stats
+
+    def submit(
+        self,
+        endpoint,
+        instrument_id,
+        job,
+        key=None,
+        body=None,
+        pinned=True,
+        account=None,
+    ):
+        """Queue ``job`` (a coroutine function without arguments) on the
+        workers of ``account``.
+
+        Unpinned jobs run at once as their own task, outside the per-instrument
+        order, e.g. signals that are netted anyway. ``body`` is the decoded
+        JSON payload or the raw body. Returns ``(accepted, key)``, ``accepted``
+        is False for duplicates.
+        """
+        ttl = None
+        if not key:
+            delivery = delivery_id(body)
+            if delivery is not None:
+                key = derive_key(endpoint, delivery)
+            else:
+                key = derive_key(endpoint, body)
+                ttl = self.retry_ttl
+
+        with self._lock:
+            stats = self._stats(endpoint)
+            if not self.idempotency.add(key, ttl):
+                stats.duplicates += 1
+                logger.info(f"Duplicate {endpoint} signal dropped: {key}")
+                return False, key
+            stats.accepted += 1
+            stats.depth += 1
+
+        signal = Signal(endpoint, instrument_id, job, key)
+        if not pinned:
+            asyncio.run_coroutine_threadsafe(self._execute(signal), self.loop)
+            return True, key
+
+        self.loop.call_soon_threadsafe(self._enqueue, account, signal)
+        return True, key
+
+    def _enqueue(self, account, signal):
+        queues = self.queues.get(account)
+        if queues is None:
+            queues = self.queues[account] = [
+                asyncio.Queue() for _ in range(self.workers)
+            ]
+            self._tasks.extend(asyncio.create_task(self._work(q)) for q in queues)
+        queue = queues[zlib.crc32(str(signal.instrument_id).encode()) % len(queues)]
+        queue.put_nowait(signal)
+
+    async def _work(self, queue):
+        while True:
+            await self._execute(await queue.get())
+
+    async def _execute(self, signal):
+        started = time.monotonic()
+        failed = False
+        try:
+            result = await signal.job()
+            failed = is_failure(result)
+            logger.info(f"{signal.endpoint} signal {signal.key}: {result}")
+        except Exception as e:
+            failed = True
+            logger.exception(f"Error thrown when executing {signal.endpoint}: {e}")
+        if failed:
+            self.idempotency.discard(signal.key)
+
+        finished = time.monotonic()
+        with self._lock:
+            stats = self._stats(signal.endpoint)
+            stats.depth -= 1
+            if failed:
+                stats.failed += 1
+            else:
+                stats.executed += 1
+            wait = started - signal.created_at
+            elapsed = finished - started
+            stats.wait_total += wait
+            stats.wait_max = max(stats.wait_max, wait)
+            stats.exec_total += elapsed
+            stats.exec_max = max(stats.exec_max, elapsed)
+
+    def snapshot(self):
+        with self._lock:
+            return {endpoint: stats.as_dict() for endpoint, stats in self.stats.items()}